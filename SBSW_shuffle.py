@@ -11,6 +11,14 @@ where each element is a 3-element iterable of the form <node_1, node_2, start>
 that is the product of performing the relevant shuffling algorithm over the
 input data.
 
+Each algorithm also has an array counterpart, named with an ``_arrays``
+suffix, over integer node id columns.  Node pairs are encoded as single int64
+values by ``dataset.pair_ids`` and grouped with ``np.unique``, so each shuffle
+is a permutation over pair groups or start times rather than a rebuild of
+nested dictionaries keyed by strings or frozensets.  Each takes <node_1,
+node_2, start> arrays and a ``numpy.random.RandomState`` and returns the
+shuffled <node_1, node_2, start> arrays.
+
 
 If called as main script:
 
@@ -30,6 +38,17 @@ positional parameters
     A shuffling algorithm acronym from the set ["Original", "DCWB", "DCB",
     "DCW", "D"].
 
+flags
+
+    --numpy : shuffle with the array implementations.
+
+    --simple : with the D shuffle, reject or rewire matchings with self-loops
+    or multi-edges.
+
+    --replicas : parse the encounters once and write this many shuffled
+    replicas, one per seed counting up from --seed, to files named by
+    --out-pattern, optionally spread over --workers processes.
+
 DCWB, DCB, DCW and D shuffling of encounters as described in "Slow But Small
 World: How Network Topology and Burstiness Slow Down
 Spreading". http://www.barabasilab.com/pubs/CCNR-ALB_Publications/201102-18_PhysRevE-Smallbut/201102-18_PhysRevE-Smallbut.pdf
@@ -38,8 +57,12 @@ Spreading". http://www.barabasilab.com/pubs/CCNR-ALB_Publications/201102-18_Phys
 import sys
 from collections import defaultdict
 import random
-random.seed(1000)
 import argparse
+import functools
+import numpy as np
+import dataset
+import replica_pool
+from session_shuffle import grouped_permutation
 
 
 def dcwb(encounters):
@@ -174,7 +197,238 @@ def d(encounters):
     return shuffled
 
 
-def main(method):
+def pair_groups(node_1, node_2):
+    """Group encounters by unordered node pair.
+
+    Returns
+
+        A three-tuple <pairs, group, counts> where pairs is the sorted array of
+        distinct pair ids (see ``dataset.pair_ids``), group gives the index
+        into pairs of each encounter and counts is the number of encounters
+        of each pair.
+
+    """
+    return np.unique(dataset.pair_ids(node_1, node_2), return_inverse=True,
+                     return_counts=True)
+
+
+def _regroup(pairs, group, new_group, start):
+    # give each encounter the pair of its group's new group.
+    node_1, node_2 = dataset.unpack_pair_ids(pairs[new_group[group]])
+    return node_1, node_2, start
+
+
+def dcwb_arrays(node_1, node_2, start, rng):
+    """Array counterpart of ``dcwb``.
+
+    Start time sequences are permuted among pairs with the same number of
+    encounters.
+
+    """
+    pairs, group, counts = pair_groups(node_1, node_2)
+    return _regroup(pairs, group, grouped_permutation(counts, rng), start)
+
+
+def dcb_arrays(node_1, node_2, start, rng):
+    """Array counterpart of ``dcb``.
+
+    Start time sequences are permuted among all pairs.
+
+    """
+    pairs, group, counts = pair_groups(node_1, node_2)
+    return _regroup(pairs, group, rng.permutation(len(pairs)), start)
+
+
+def dcw_arrays(node_1, node_2, start, rng):
+    """Array counterpart of ``dcw``.
+
+    Pairs keep their number of encounters but start times are permuted among
+    all encounters.
+
+    """
+    return node_1, node_2, start[rng.permutation(len(start))]
+
+
+# values of the simple argument of d_arrays.
+SIMPLE_MODES = ['reject', 'rewire']
+
+
+def _bad_edges(edges):
+    """Return a mask of self-loops and all but the first of repeated edges."""
+    bad = edges[:, 0] == edges[:, 1]
+    pair = dataset.pair_ids(edges[:, 0], edges[:, 1])
+    order = np.argsort(pair, kind='mergesort')
+    repeat = np.zeros(len(pair), dtype=bool)
+    repeat[order[1:]] = pair[order[1:]] == pair[order[:-1]]
+    return bad | repeat
+
+
+def stub_match(degree, rng, simple=None, max_tries=100):
+    """Pair node stubs uniformly at random (the configuration model).
+
+    Parameters
+
+        degree : an array holding the degree of each node id.  Its sum must be
+        even.
+
+        rng : a ``numpy.random.RandomState``.
+
+        simple : None to allow self-loops and multi-edges, "reject" to redraw
+        the whole matching until there are none, or "rewire" to repeatedly
+        re-pair only the stubs of offending edges together with an equal
+        number of randomly chosen other edges.
+
+        max_tries : the number of redraws or rewiring rounds to attempt before
+        giving up.  Any remaining self-loops or multi-edges are kept, with a
+        warning.
+
+    Returns
+
+        A (sum(degree) / 2 x 2) array of node ids, one row per edge.
+
+    """
+    stubs = np.repeat(np.arange(len(degree), dtype=dataset.NODE_DTYPE),
+                      degree)
+    edges = stubs[rng.permutation(len(stubs))].reshape(-1, 2)
+    if simple is None:
+        return edges
+    for _ in range(max_tries):
+        bad = _bad_edges(edges)
+        if not bad.any():
+            return edges
+        if simple == 'reject':
+            edges = stubs[rng.permutation(len(stubs))].reshape(-1, 2)
+            continue
+        # re-pair the offending edges' stubs with those of as many others.
+        bad_idx = np.flatnonzero(bad)
+        good_idx = np.flatnonzero(~bad)
+        good_idx = good_idx[rng.permutation(len(good_idx))[:len(bad_idx)]]
+        idx = np.concatenate([bad_idx, good_idx])
+        pool = edges[idx].ravel()
+        edges[idx] = pool[rng.permutation(len(pool))].reshape(-1, 2)
+    if _bad_edges(edges).any():
+        print >> sys.stderr, 'WARNING: %d self-loops or multi-edges remain ' \
+            'after %d tries.' % (_bad_edges(edges).sum(), max_tries)
+    return edges
+
+
+def d_arrays(node_1, node_2, start, rng, simple=None):
+    """Array counterpart of ``d``.
+
+    Every node keeps its degree in the contact graph via configuration model
+    stub matching (see ``stub_match`` for the simple argument).  Per-pair
+    encounter counts are then assigned to the new pairs, and start times to
+    the new encounters, at random.
+
+    """
+    pairs, group, counts = pair_groups(node_1, node_2)
+    low, high = dataset.unpack_pair_ids(pairs)
+    degree = np.bincount(np.concatenate([low, high]))
+    edges = stub_match(degree, rng, simple)
+    repeats = counts[rng.permutation(len(counts))]
+    return (np.repeat(edges[:, 0], repeats), np.repeat(edges[:, 1], repeats),
+            start[rng.permutation(len(start))])
+
+
+def read_encounters(lines):
+    """Parse <node_1, node_2, start> lines into integer columns.
+
+    Returns
+
+        A two-tuple <encounters, macs> where encounters is a three-tuple of
+        <node_1, node_2, start> arrays and macs is the list of node names in
+        id order.
+
+    """
+    macs_1, macs_2, starts = [], [], []
+    for line in lines:
+        mac1, mac2, start = line.strip().split(',')
+        macs_1.append(mac1)
+        macs_2.append(mac2)
+        starts.append(int(start))
+    ids, macs = dataset.intern(macs_1 + macs_2)
+    return (ids[:len(macs_1)], ids[len(macs_1):],
+            np.array(starts, dtype=dataset.TIME_DTYPE)), macs
+
+
+def write_encounters(encounters, macs, out=sys.stdout):
+    """Write encounter arrays as comma-separated lines of names."""
+    for n1, n2, start in zip(*[c.tolist() for c in encounters]):
+        print >> out, ','.join([macs[n1], macs[n2], str(start)])
+
+
+def replicas(encounters, method, seeds, simple=None):
+    """Generate independently shuffled replicas of one encounter set.
+
+    Parameters
+
+        encounters : a three-tuple of <node_1, node_2, start> arrays, shared by
+        every replica.
+
+        method : a shuffling acronym, e.g. "DCW", or "Original".
+
+        seeds : an iterable of random seeds.  Each replica draws from its own
+        ``RandomState`` seeded with its seed, so a replica depends only on its
+        seed.
+
+        simple : for the D shuffle, as per ``stub_match``.
+
+    Returns
+
+        A generator of two-tuples <seed, shuffled encounters>.
+
+    """
+    for seed in seeds:
+        if method.lower() == 'original':
+            yield seed, encounters
+            continue
+        rng = np.random.RandomState(seed)
+        if method.lower() == 'd':
+            yield seed, d_arrays(*(tuple(encounters) + (rng, simple)))
+            continue
+        shuf_func = getattr(sys.modules[__name__], method.lower() + '_arrays')
+        yield seed, shuf_func(*(tuple(encounters) + (rng,)))
+
+
+def _replica(encounters, method, simple, seed):
+    for _, shuffled in replicas(encounters, method, [seed], simple):
+        return shuffled
+
+
+def _write_replica(macs, encounters, out):
+    write_encounters(encounters, macs, out)
+
+
+def write_replicas(encounters, macs, method, seeds, pattern, workers=1,
+                   simple=None):
+    """Write shuffled replicas of an encounter set to files.
+
+    Parameters
+
+        encounters, method, seeds, simple : as per ``replicas``.
+
+        macs : the list of node names in id order.
+
+        pattern : the file name of each replica, formatted with its seed.
+
+        workers : the number of processes to spread replicas over.  The files
+        do not depend on this value.
+
+    """
+    replica_pool.write_replicas(
+        functools.partial(_replica, encounters, method, simple),
+        functools.partial(_write_replica, macs), seeds, pattern, workers)
+
+
+def main_arrays(method, seed=1000, simple=None):
+    """As per ``main`` but shuffling with the array implementations."""
+    encounters, macs = read_encounters(sys.stdin)
+    for _, shuffled in replicas(encounters, method, [seed], simple):
+        write_encounters(shuffled, macs)
+
+
+def main(method, seed=1000):
+    random.seed(seed)
     # read in original encounters
     original_encounters = []
     for line in sys.stdin.readlines():
@@ -204,5 +458,30 @@ if __name__ == "__main__":
     parser.add_argument('method',
                         type=str,
                         help='The shuffling acronym to perform.')
+    parser.add_argument('--numpy', action='store_true',
+                        help='Shuffle with the array implementations.')
+    parser.add_argument('-s', '--seed', type=int, default=1000,
+                        help='Random seed, or first seed of --replicas.')
+    parser.add_argument('-r', '--replicas', type=int, default=None,
+                        help='Number of replicas to write, with seeds ' + \
+                        'counting up from --seed.  Implies --numpy.')
+    parser.add_argument('-o', '--out-pattern', type=str,
+                        default='encounters_%d.csv',
+                        help='File name pattern of --replicas output, ' + \
+                        'formatted with the seed.')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of processes to write replicas with.')
+    parser.add_argument('--simple', type=str, default=None,
+                        choices=SIMPLE_MODES,
+                        help='How the D shuffle avoids self-loops and ' + \
+                        'multi-edges.  Implies --numpy.')
     args = parser.parse_args()
-    main(args.method)
+    if args.replicas:
+        encounters, macs = read_encounters(sys.stdin)
+        write_replicas(encounters, macs, args.method,
+                       range(args.seed, args.seed + args.replicas),
+                       args.out_pattern, args.workers, args.simple)
+    elif args.numpy or args.simple:
+        main_arrays(args.method, args.seed, args.simple)
+    else:
+        main(args.method, args.seed)
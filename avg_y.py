@@ -22,6 +22,7 @@ Notes
 import sys
 from collections import defaultdict
 from operator import itemgetter
+from running_stats import RunningStats
 
 def avg_y(xs, ys):
     """Average y-values for each x-value.
@@ -54,16 +55,17 @@ def avg_y(xs, ys):
 
     
 if __name__ == "__main__":
-    xs, ys = [], []
+    # stream through running_stats rather than holding every y-value.
+    running = RunningStats()
     for line in sys.stdin:
         try:
             x,y = map(float, line.strip().split(','))
         except:
             print >> sys.stderr, line.strip(), 'is not all numeric'
             raise
-        xs.append(x)
-        ys.append(y)
-    results = avg_y(xs, ys)
-    for r in results:
+        running.add(x, y)
+    if len(set(running.count.tolist())) > 1:
+        print >> sys.stderr, 'different x-vals with different y-counts!'
+        sys.exit(1)
+    for r in running.rows(['avg', 'count']):
         print ','.join(map(str,r))
-        
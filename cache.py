@@ -0,0 +1,204 @@
+"""A content-addressed, size-bounded on-disk cache of intermediate artifacts.
+
+Shuffled sessions, encounters and trial results are expensive to regenerate
+but depend only on their input data and parameters.  Each artifact is stored
+as a compressed ``.npz`` file named by a SHA-1 key built from a digest of its
+input and every parameter that affects it, so a change to any of them simply
+misses the cache.  Reading an artifact refreshes its modification time and,
+once the cache grows beyond its size bound, the least recently used artifacts
+are evicted.
+
+If called as main script:
+
+positional parameters
+
+    command : one of "key", "get" or "put".
+
+    key : print a key built from the remaining arguments and the content
+    digests of any files given with -i.
+
+    get KEY : write the text cached under KEY to stdout, or exit with status 1
+    if there is none.
+
+    put KEY : cache the text read from stdin under KEY.
+
+flags
+
+    Call the script with -h for more information.  Flags must precede the
+    command, e.g. ``python cache.py -i st_lucia.csv key session_shuffle TL``.
+
+"""
+import os
+import sys
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+
+TEXT = 'text'
+# part of every key.  Bump it whenever a change alters the output of any
+# cached step, so artifacts from earlier versions are missed rather than
+# reused.
+CACHE_VERSION = 3
+
+
+def digest(data):
+    """Return the SHA-1 hex digest of a string."""
+    return hashlib.sha1(data).hexdigest()
+
+
+def file_digest(path, block_size=1 << 20):
+    """Return the SHA-1 hex digest of a file's content."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), ''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def make_key(*parts, **params):
+    """Build a cache key from positional parts and named parameters.
+
+    Parameters
+
+        parts : values identifying the artifact, e.g. an input digest and the
+        name of the algorithm producing the artifact.
+
+        params : named parameters of the algorithm, e.g. runway=864000.
+
+    Returns
+
+        A SHA-1 hex digest that depends on ``CACHE_VERSION`` and the value of
+        every argument, and on the order of parts but not of params.
+
+    """
+    return digest(repr((CACHE_VERSION, map(str, parts),
+                        sorted((k, str(v)) for k, v in params.iteritems()))))
+
+
+class ArtifactCache(object):
+    """Named sets of arrays stored under a directory, keyed by hex digest.
+
+    Parameters
+
+        root : the cache directory.  It is created if necessary.
+
+        max_bytes : if not None, the size the cache is trimmed back to after
+        each store by deleting the least recently used artifacts.
+
+    """
+    def __init__(self, root, max_bytes=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        if not os.path.isdir(root):
+            os.makedirs(root)
+
+    def path(self, key):
+        return os.path.join(self.root, key + '.npz')
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def get(self, key):
+        """Return the dictionary of arrays stored under key, or None."""
+        path = self.path(key)
+        try:
+            with np.load(path) as f:
+                arrays = dict((name, f[name]) for name in f.files)
+        except IOError:
+            return None
+        # mark as recently used.
+        os.utime(path, None)
+        return arrays
+
+    def put(self, key, arrays):
+        """Store a dictionary of arrays under key."""
+        fd, tmp = tempfile.mkstemp(suffix='.npz', dir=self.root)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.chmod(tmp, 0644)
+        # readers never see a partially written artifact.
+        os.rename(tmp, self.path(key))
+        self.evict(keep=key)
+
+    def get_text(self, key):
+        """Return the text stored under key by ``put_text``, or None."""
+        arrays = self.get(key)
+        if arrays is None:
+            return None
+        return arrays[TEXT].tostring()
+
+    def put_text(self, key, text):
+        """Store a string, e.g. the stdout of a pipeline, under key."""
+        self.put(key, {TEXT: np.frombuffer(text, dtype=np.uint8)})
+
+    def size(self):
+        """Return the total size in bytes of the cached artifacts."""
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self, keep=None):
+        """Delete least recently used artifacts until within max_bytes.
+
+        Parameters
+
+            keep : the key of an artifact never to evict, e.g. the one just
+            stored.
+
+        """
+        if self.max_bytes is None:
+            return
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        keep_path = None if keep is None else self.path(keep)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep_path:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='See module description.')
+    parser.add_argument('-d', '--dir', type=str, default='./tmp/cache',
+                        help='Cache directory.')
+    parser.add_argument('-m', '--max-bytes', type=int, default=None,
+                        help='Trim the cache to this many bytes after a put.')
+    parser.add_argument('-i', '--input', type=str, action='append',
+                        default=[],
+                        help='For key, a file whose content digest is part ' +\
+                        'of the key.  May be repeated.')
+    parser.add_argument('command', type=str, choices=['key', 'get', 'put'])
+    parser.add_argument('args', type=str, nargs='*')
+    args = parser.parse_args()
+
+    if args.command == 'key':
+        print make_key(*(map(file_digest, args.input) + args.args))
+        sys.exit(0)
+    if len(args.args) != 1:
+        parser.error('%s takes exactly one key' % args.command)
+    cache = ArtifactCache(args.dir, args.max_bytes)
+    if args.command == 'get':
+        text = cache.get_text(args.args[0])
+        if text is None:
+            sys.exit(1)
+        sys.stdout.write(text)
+    else:
+        cache.put_text(args.args[0], sys.stdin.read())
@@ -21,6 +21,8 @@ stdout
 """
 import sys
 from collections import defaultdict
+import numpy as np
+import dataset
 
 def lcc(contacts):
     """Calculate largest connection component (LCC).
@@ -71,6 +73,71 @@ def lcc(contacts):
         
     
 
+def lcc_arrays(node_1, node_2, num_nodes=None):
+    """Calculate the LCC of contacts between integer node ids.
+
+    Uses a union-find (disjoint set) structure with path compression and
+    union by size, so a single near-linear pass over the contacts suffices.
+
+    Parameters
+
+        node_1, node_2 : equal-length integer arrays, where each index is a
+        contact between node_1[i] and node_2[i].
+
+        num_nodes : the length of the returned node mask.  Defaults to one
+        more than the largest node id.
+
+    Returns
+
+        A two-tuple <in_lcc, keep>.  in_lcc is a boolean array indexed by
+        node id that is True for nodes in the LCC, and keep is a boolean array
+        indexed by contact that is True for contacts in the LCC.  When
+        components tie for largest, the one containing the smallest node id
+        is chosen.
+
+    """
+    node_1 = np.asarray(node_1)
+    node_2 = np.asarray(node_2)
+    if num_nodes is None:
+        num_nodes = int(max(node_1.max(), node_2.max())) + 1 \
+                    if len(node_1) > 0 else 0
+    in_lcc = np.zeros(num_nodes, dtype=bool)
+    if len(node_1) == 0:
+        return in_lcc, np.zeros(0, dtype=bool)
+    # work over the dense ids of nodes that actually occur.
+    nodes, inverse = np.unique(np.concatenate([node_1, node_2]),
+                               return_inverse=True)
+    parent = range(len(nodes))
+    size = [1] * len(nodes)
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        # path compression
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    num_contacts = len(node_1)
+    for a, b in zip(inverse[:num_contacts].tolist(),
+                    inverse[num_contacts:].tolist()):
+        a, b = find(a), find(b)
+        if a == b:
+            continue
+        # union by size
+        if size[a] < size[b]:
+            a, b = b, a
+        parent[b] = a
+        size[a] += size[b]
+    roots = np.array([find(x) for x in range(len(nodes))])
+    root_sizes = np.array(size)[roots]
+    # first (i.e. smallest id) node of the largest component.
+    largest = roots[np.argmax(root_sizes)]
+    in_lcc[nodes[roots == largest]] = True
+    return in_lcc, in_lcc[node_1]
+
+
 if __name__ == '__main__':
     encounters = []
     for line in sys.stdin:
@@ -78,8 +145,10 @@ if __name__ == '__main__':
         mac1, mac2, rest = fields[0], fields[1], fields[2:]
         record = [mac1, mac2] + rest
         encounters.append(record)
-    in_lcc = lcc([[r[0],r[1]] for r in encounters])
+    ids, _ = dataset.intern([r[0] for r in encounters] +
+                            [r[1] for r in encounters])
+    _, keep = lcc_arrays(ids[:len(encounters)], ids[len(encounters):])
     # filter contact events to only those in LCC.
-    encounters = filter(lambda x: x[0] in in_lcc, encounters)
-    for record in encounters:
-        print ','.join(record)
+    for record, k in zip(encounters, keep.tolist()):
+        if k:
+            print ','.join(record)
@@ -0,0 +1,341 @@
+"""Columnar session and encounter stores with integer-interned nodes.
+
+Sessions are held as four NumPy columns -- node ids (int32), location ids
+(int32), start times (int64) and end times (int64) -- together with the lists
+needed to translate ids back to the original MAC and AP names.  A store can be
+saved to a directory of ``.npy`` files and reloaded by memory-mapping, so that
+repeated runs over ``st_lucia.csv`` or ``uq.csv`` neither re-parse the CSV nor
+hold a Python list per session.  Encounters are held in an
+``EncounterTimeline``, sorted by start time so that simulation windows can be
+cut by binary search.
+
+If called as main script:
+
+stdin
+
+    A set of comma-separated value lines describing sessions, each of the form
+    <node, start, end, location>.
+
+positional parameters
+
+    store : the directory to write the session store to.
+
+"""
+import os
+import sys
+import argparse
+import numpy as np
+
+NODE_DTYPE = np.int32
+LOC_DTYPE = np.int32
+TIME_DTYPE = np.int64
+
+# column name -> file name within a saved store.
+COLUMNS = ['node', 'start', 'end', 'ap']
+NAMES = ['macs', 'aps']
+
+
+def intern(names):
+    """Map a sequence of names to dense integer ids.
+
+    Parameters
+
+        names : an n-length sequence of strings.
+
+    Returns
+
+        A two-tuple <ids, vocabulary> where ids is an n-length int32 array and
+        vocabulary is a list such that ``vocabulary[ids[i]] == names[i]``.
+        Ids are assigned in sorted name order.
+
+    """
+    vocabulary, ids = np.unique(np.asarray(names), return_inverse=True)
+    return ids.astype(NODE_DTYPE), vocabulary.tolist()
+
+
+def pair_ids(node_1, node_2):
+    """Encode unordered node pairs as single int64 values.
+
+    Parameters
+
+        node_1, node_2 : equal-length integer arrays of node ids.
+
+    Returns
+
+        An int64 array where each element is ``min_id << 32 | max_id`` so that
+        <a, b> and <b, a> encode to the same value.
+
+    """
+    node_1 = np.asarray(node_1, dtype=np.int64)
+    node_2 = np.asarray(node_2, dtype=np.int64)
+    return (np.minimum(node_1, node_2) << 32) | np.maximum(node_1, node_2)
+
+
+def unpack_pair_ids(pairs):
+    """Decode values produced by ``pair_ids``.
+
+    Returns
+
+        A two-tuple <low_ids, high_ids> of int32 arrays.
+
+    """
+    pairs = np.asarray(pairs, dtype=np.int64)
+    return ((pairs >> 32).astype(NODE_DTYPE),
+            (pairs & 0xFFFFFFFF).astype(NODE_DTYPE))
+
+
+class SessionStore(object):
+    """Sessions as integer columns plus the vocabularies to decode them.
+
+    Attributes
+
+        node : int32 array of node ids, indexes ``macs``.
+
+        start, end : int64 arrays of session start and end times.
+
+        ap : int32 array of location ids, indexes ``aps``.
+
+        macs : list of node names in id order.
+
+        aps : list of location names in id order.
+
+    """
+    def __init__(self, node, start, end, ap, macs, aps):
+        self.node = node
+        self.start = start
+        self.end = end
+        self.ap = ap
+        self.macs = macs
+        self.aps = aps
+        self._mac_ids = None
+        self._ap_ids = None
+
+    def __len__(self):
+        return len(self.node)
+
+    @property
+    def num_nodes(self):
+        return len(self.macs)
+
+    @property
+    def num_aps(self):
+        return len(self.aps)
+
+    @property
+    def mac_ids(self):
+        """Dictionary of node name -> node id."""
+        if self._mac_ids is None:
+            self._mac_ids = dict((m, i) for i, m in enumerate(self.macs))
+        return self._mac_ids
+
+    @property
+    def ap_ids(self):
+        """Dictionary of location name -> location id."""
+        if self._ap_ids is None:
+            self._ap_ids = dict((a, i) for i, a in enumerate(self.aps))
+        return self._ap_ids
+
+    def columns(self):
+        """Return the four session columns as <node, start, end, ap>."""
+        return self.node, self.start, self.end, self.ap
+
+    def sessions(self):
+        """Return sessions in the list-of-lists form the scripts consume.
+
+        Returns
+
+            A list of 4-element lists of the form <node, start, end,
+            location> using the original node and location names.
+
+        """
+        macs, aps = self.macs, self.aps
+        return [[macs[n], s, e, aps[a]] for n, s, e, a in
+                zip(self.node.tolist(), self.start.tolist(),
+                    self.end.tolist(), self.ap.tolist())]
+
+    def with_columns(self, node=None, start=None, end=None, ap=None):
+        """Return a store sharing this store's vocabularies.
+
+        Any column not supplied is taken from this store, which makes it easy
+        to wrap the output of an array-based shuffle.
+
+        """
+        return SessionStore(self.node if node is None else node,
+                            self.start if start is None else start,
+                            self.end if end is None else end,
+                            self.ap if ap is None else ap,
+                            self.macs, self.aps)
+
+    def save(self, path):
+        """Save the store as a directory of ``.npy`` files."""
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name in COLUMNS:
+            np.save(os.path.join(path, name + '.npy'), getattr(self, name))
+        for name in NAMES:
+            np.save(os.path.join(path, name + '.npy'),
+                    np.asarray(getattr(self, name), dtype=np.str_))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a store previously written by ``save``.
+
+        Parameters
+
+            path : the store directory.
+
+            mmap : if True, the session columns are memory-mapped read-only
+            rather than read into memory.
+
+        """
+        mode = 'r' if mmap else None
+        cols = [np.load(os.path.join(path, name + '.npy'), mmap_mode=mode)
+                for name in COLUMNS]
+        names = [np.load(os.path.join(path, name + '.npy')).tolist()
+                 for name in NAMES]
+        return cls(*(cols + names))
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Parse comma-separated <node, start, end, location> lines."""
+        macs, starts, ends, aps = [], [], [], []
+        for line in lines:
+            f = line.strip().split(',')
+            macs.append(f[0])
+            starts.append(int(f[1]))
+            ends.append(int(f[2]))
+            aps.append(f[3])
+        node, mac_names = intern(macs)
+        ap, ap_names = intern(aps)
+        return cls(node, np.array(starts, dtype=TIME_DTYPE),
+                   np.array(ends, dtype=TIME_DTYPE), ap.astype(LOC_DTYPE),
+                   mac_names, ap_names)
+
+    @classmethod
+    def from_csv(cls, filename):
+        """Parse a session file such as ``st_lucia.csv`` or ``uq.csv``."""
+        with open(filename) as f:
+            return cls.from_lines(f)
+
+
+class EncounterTimeline(object):
+    """Encounters sorted by start time, with binary-search windowing.
+
+    Windows are returned as slices of the sorted columns, i.e. views that
+    share memory with the timeline rather than copies.
+
+    Attributes
+
+        node_1, node_2 : int32 arrays of encountering node ids, indexing
+        ``macs``.
+
+        start : int64 array of encounter start times, in non-decreasing order.
+
+        macs : list of node names in id order (may be None).
+
+    """
+    def __init__(self, node_1, node_2, start, macs=None):
+        order = np.argsort(start, kind='mergesort')
+        self.node_1 = np.asarray(node_1, dtype=NODE_DTYPE)[order]
+        self.node_2 = np.asarray(node_2, dtype=NODE_DTYPE)[order]
+        self.start = np.asarray(start, dtype=TIME_DTYPE)[order]
+        self.macs = macs
+
+    def __len__(self):
+        return len(self.start)
+
+    @property
+    def num_nodes(self):
+        if self.macs is not None:
+            return len(self.macs)
+        if len(self) == 0:
+            return 0
+        return int(max(self.node_1.max(), self.node_2.max())) + 1
+
+    @property
+    def first(self):
+        return int(self.start[0])
+
+    @property
+    def last(self):
+        return int(self.start[-1])
+
+    def bounds(self, start, end, closed=True):
+        """Return the index range of encounters starting within a period.
+
+        Parameters
+
+            start, end : the period of interest.
+
+            closed : if True the period is [start, end], otherwise it is
+            [start, end).
+
+        Returns
+
+            A two-tuple <lo, hi> such that encounters lo to hi - 1 (in time
+            order) started within the period.
+
+        """
+        lo = int(np.searchsorted(self.start, start, side='left'))
+        hi = int(np.searchsorted(self.start, end,
+                                 side='right' if closed else 'left'))
+        return lo, hi
+
+    def slice(self, lo, hi):
+        """Return the <node_1, node_2, start> views of encounters lo to hi."""
+        return self.node_1[lo:hi], self.node_2[lo:hi], self.start[lo:hi]
+
+    def window(self, start, end):
+        """Return views of the encounters with start <= start time <= end."""
+        return self.slice(*self.bounds(start, end))
+
+    def candidate_bounds(self, runway):
+        """Return the index range of encounters that may seed a simulation.
+
+        Candidates are encounters starting before the last encounter start
+        time minus ``runway``, ensuring ``runway`` seconds of simulation time.
+
+        """
+        return self.bounds(self.first, self.last - runway, closed=False)
+
+    def source_candidates(self, runway):
+        """Return views of the encounters that may seed a simulation."""
+        return self.slice(*self.candidate_bounds(runway))
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Parse comma-separated <mac1, mac2, start> lines.
+
+        Any fields beyond the third are ignored.
+
+        """
+        macs_1, macs_2, starts = [], [], []
+        for line in lines:
+            f = line.strip().split(',')
+            macs_1.append(f[0])
+            macs_2.append(f[1])
+            starts.append(int(f[2]))
+        ids, macs = intern(macs_1 + macs_2)
+        return cls(ids[:len(macs_1)], ids[len(macs_1):], starts, macs)
+
+
+def load_sessions(source, mmap=True):
+    """Load a session store from either a saved store or a ``.csv`` file.
+
+    Parameters
+
+        source : a directory written by ``SessionStore.save`` or the path of a
+        comma-separated session file.
+
+    """
+    if os.path.isdir(source):
+        return SessionStore.load(source, mmap)
+    return SessionStore.from_csv(source)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='See module description.')
+    parser.add_argument('store', type=str,
+                        help='Directory to write the session store to.')
+    args = parser.parse_args()
+    SessionStore.from_lines(sys.stdin).save(args.store)
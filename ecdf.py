@@ -11,20 +11,106 @@ stdout
     List of <x,y> pairs representing the ECDF of the input data, one per line.
     x and y are comma-separated.
 
+flags
+
+    max-points : if given, output at most this many of the ECDF's points,
+    chosen according to --mode, so the output size does not grow with the
+    input.  Call the script with -h for more information.
+
 """
 import sys
 import numpy as np
 import argparse
 
+MODES = ['quantile', 'log', 'unique']
+
+
 def ecdf(values):
-    sorted_float_values = sorted(map(float, sorted(values)))
-    num_values = len(sorted_float_values)
-    return [[x, float(i)/num_values] for i, x in enumerate(sorted_float_values)]
+    """Return the ECDF of values as a list of <x, y> pairs, one per value."""
+    xs, ys = ecdf_arrays(values)
+    return [[x, y] for x, y in zip(xs.tolist(), ys.tolist())]
+
+
+def ecdf_arrays(values, max_points=None, mode='quantile'):
+    """Calculate the ECDF of values, optionally at a bounded number of points.
+
+    The full ECDF has one point <x_i, i / n> per value, where x_i is the i-th
+    smallest of the n values.  Any points left out are simply skipped, so
+    every point returned is exactly one of the full ECDF's points.
+
+    Parameters
+
+        values : a sequence of numbers.
+
+        max_points : if not None, the maximum number of points to return
+        (at least two, as the first and last points are always returned).
+
+        mode : how to choose the points to return.
+
+            quantile : points evenly spaced in y (i.e. by index).
+
+            log : for each of max_points log-spaced x-values, the last point
+            at or below it, as suits a plot with a log x-axis.  Falls back to
+            quantile if no value is positive.
+
+            unique : the first and last point of each run of equal values,
+            which preserves the shape of the steps exactly.  If there are more
+            than max_points of these, they are thinned evenly.
+
+    Returns
+
+        A two-tuple <xs, ys> of float arrays.
+
+    """
+    xs = np.sort(np.asarray(values, dtype=float))
+    n = len(xs)
+    ys = np.arange(n) / float(n) if n else np.zeros(0)
+    if n == 0:
+        return xs, ys
+    if max_points is not None:
+        max_points = max(max_points, 2)
+    if mode == 'unique':
+        change = xs[1:] != xs[:-1]
+        # first and last index of each run of equal values.
+        idx = np.union1d(np.append(0, np.nonzero(change)[0] + 1),
+                         np.append(np.nonzero(change)[0], n - 1))
+        if max_points is not None and len(idx) > max_points:
+            idx = idx[_spaced(len(idx), max_points)]
+    elif max_points is None or n <= max_points:
+        return xs, ys
+    elif mode == 'log' and xs[-1] > 0:
+        lowest = xs[np.searchsorted(xs, 0, side='right')]
+        grid = np.logspace(np.log10(lowest), np.log10(xs[-1]), max_points)
+        grid[[0, -1]] = lowest, xs[-1]
+        idx = np.searchsorted(xs, grid, side='right') - 1
+        idx = np.union1d(idx, [0])
+        if len(idx) > max_points:
+            # make room for the first point, below the lowest grid value.
+            idx = np.delete(idx, 1)
+    elif mode in MODES:
+        idx = _spaced(n, max_points)
+    else:
+        raise ValueError('Unrecognized mode %s' % mode)
+    return xs[idx], ys[idx]
+
+
+def _spaced(n, num):
+    """Return up to num (>= 2) evenly spaced indices of n, with 0 and n - 1."""
+    return np.unique(np.round(np.linspace(0, n - 1, num)).astype(int))
+
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='See module description.')
+    parser.add_argument('-m', '--max-points', type=int, default=None,
+                        help='Output at most this many points.')
+    parser.add_argument('--mode', type=str, choices=MODES, default='quantile',
+                        help='How to choose the points output with ' +\
+                        '--max-points.  See ecdf_arrays.')
+    args = parser.parse_args()
     vals = []
     for line in sys.stdin:
         vals.append(float(line))
 
-    x_y_pairs = ecdf(vals)
-    print '\n'.join([','.join(map(str,p)) for p in x_y_pairs])
+    xs, ys = ecdf_arrays(vals, args.max_points, args.mode)
+    for x, y in zip(xs.tolist(), ys.tolist()):
+        print ','.join(map(str, [x, y]))
@@ -15,6 +15,7 @@ import (
 
 func main() {
 	u := flag.Bool("u", false, "Unique encounters (not total).")
+	b := flag.Bool("b", false, "Both total and unique encounters.")
 	flag.Parse()
 
 	// read contacts from stdin
@@ -27,6 +28,17 @@ func main() {
 		contacts = append(contacts, Contact{node1, node2, start})
 	}
 
+	if *b {
+		for _, r := range both(contacts) {
+			fmt.Println(strings.Join([]string{
+				strconv.Itoa(r.one),
+				strconv.Itoa(r.two),
+				strconv.Itoa(r.three)},
+				","))
+		}
+		return
+	}
+
 	// calculate results
 	var results []IntPair
 	if *u {
@@ -88,10 +100,47 @@ func unique(contacts []Contact) []IntPair {
 	return counts
 }
 
+// total and unique counts from a single sort.
+func both(contacts []Contact) []IntTriple {
+	counts := []IntTriple{}
+	if len(contacts) == 0 {
+		return counts
+	}
+	sort.Stable(ByStart(contacts))
+	start := contacts[0].start
+	count := 0
+	unique_count := 0
+	current_time := contacts[0].start
+	node_pairs := make(map[NodePair]bool)
+	for _, c := range contacts {
+		if current_time != c.start {
+			counts = append(counts, IntTriple{current_time - start,
+				count, unique_count})
+		}
+		count++
+		pair := NodePair{c.node1, c.node2}
+		if c.node2 < c.node1 {
+			pair = NodePair{c.node2, c.node1}
+		}
+		if !node_pairs[pair] {
+			unique_count++
+			node_pairs[pair] = true
+		}
+		current_time = c.start
+	}
+	counts = append(counts, IntTriple{current_time - start, count,
+		unique_count})
+	return counts
+}
+
 type IntPair struct {
 	one, two int
 }
 
+type IntTriple struct {
+	one, two, three int
+}
+
 type Contact struct {
 	node1, node2 string
 	start        int
@@ -10,19 +10,25 @@ stdin
 stdout
 
     List of comma-separated pairs (one per line) of the form <time, # encounters
-    so far>.
+    so far>, or with -b triplets of the form <time, # encounters so far,
+    # unique encounter pairs so far>.
 
 Notes
 
     The default tally option is non-unique i.e. total encounters.  Call this
-    script with the -h flag to see the options available.
+    script with the -h flag to see the options available.  With -n and -d the
+    tally is sampled directly onto bucket midpoints as ``interp.py -s -d``
+    would do.
 
 """
 import sys
 import argparse
 from operator import itemgetter
+import numpy as np
+import dataset
+import grid as sampling
 
-def tally(encounters,start=None):
+def tally(encounters, start=None, grid=None):
     """Simple count of encounters vs. elapsed time.
 
     Parameters
@@ -32,6 +38,9 @@ def tally(encounters,start=None):
 
         start : if not None, the time to consider as t = 0.
 
+        grid : if not None, a sequence of elapsed times to sample the tally at
+        rather than returning one record per distinct encounter time.
+
     Returns
 
         An iterable of two-tuples where each two-tuple is of the form
@@ -57,9 +66,11 @@ def tally(encounters,start=None):
         current_time = e[START]
     # append last record
     time_tallys.append([current_time - start, count])
+    if grid is not None:
+        return sample_tally(time_tallys, grid)
     return time_tallys
 
-def unique_tally(encounters, start=None):
+def unique_tally(encounters, start=None, grid=None):
     """Count of unique encounter pairs vs. elapsed time.
 
     Parameters
@@ -69,6 +80,9 @@ def unique_tally(encounters, start=None):
 
         start : if not None, the time to consider as t = 0.
 
+        grid : if not None, a sequence of elapsed times to sample the tally at
+        rather than returning one record per distinct encounter time.
+
     Returns
 
         An iterable of two-tuples where each two-tuple is of the form
@@ -98,8 +112,129 @@ def unique_tally(encounters, start=None):
         current_time = e[START]
     # append last record
     time_tallys.append([current_time - start, count])
+    if grid is not None:
+        return sample_tally(time_tallys, grid)
     return time_tallys
 
+def sample_tally(time_tallys, grid):
+    """Sample <time_elapsed, tally> records at a set of elapsed times.
+
+    Returns
+
+        A list of <grid time, tally> two-tuples.  The tally before the first
+        record is zero.
+
+    """
+    times, counts = zip(*time_tallys)
+    return [[g, int(c)] for g, c in
+            zip(grid, sampling.sample_steps(times, counts, grid))]
+
+def tally_arrays(start_times, start=None, grid=None):
+    """Array counterpart of ``tally``.
+
+    Parameters
+
+        start_times : an array of encounter start times.
+
+        start : if not None, the time to consider as t = 0.
+
+        grid : as per ``tally``.
+
+    Returns
+
+        A two-tuple of arrays <time_elapsed, encounter_total_so_far> with one
+        element per distinct encounter start time, or per grid point if
+        ``grid`` is given.
+
+    """
+    times, counts = np.unique(start_times, return_counts=True)
+    if start is None:
+        start = times[0]
+    return _sampled(times - start, np.cumsum(counts), grid)
+
+def unique_tally_arrays(node_1, node_2, start_times, start=None, grid=None):
+    """Array counterpart of ``unique_tally``.
+
+    Parameters
+
+        node_1, node_2 : integer arrays of encountering node ids.
+
+        start_times : an array of encounter start times.
+
+        start : if not None, the time to consider as t = 0.
+
+        grid : as per ``tally``.
+
+    Returns
+
+        A two-tuple of arrays <time_elapsed, unique_pairs_so_far> with one
+        element per distinct encounter start time, or per grid point if
+        ``grid`` is given.
+
+    """
+    order = np.argsort(start_times, kind='mergesort')
+    sorted_starts = np.asarray(start_times)[order]
+    pairs = dataset.pair_ids(node_1, node_2)[order]
+    # index of each pair's earliest encounter.
+    _, first = np.unique(pairs, return_index=True)
+    new_pair = np.zeros(len(pairs), dtype=np.int64)
+    new_pair[first] = 1
+    times, last = np.unique(sorted_starts[::-1], return_index=True)
+    # index of the last encounter at each distinct time.
+    last = len(sorted_starts) - 1 - last
+    if start is None:
+        start = times[0]
+    return _sampled(times - start, np.cumsum(new_pair)[last], grid)
+
+def tallies_arrays(node_1, node_2, start_times, start=None, grid=None):
+    """Total and unique encounter tallies from a single sort.
+
+    Equivalent to calling both ``tally_arrays`` and ``unique_tally_arrays``,
+    but the encounters are sorted by start time only once.
+
+    Parameters
+
+        node_1, node_2 : integer arrays of encountering node ids.
+
+        start_times : an array of encounter start times.
+
+        start : if not None, the time to consider as t = 0.
+
+        grid : as per ``tally``.
+
+    Returns
+
+        A three-tuple of arrays <time_elapsed, encounter_total_so_far,
+        unique_pairs_so_far> with one element per distinct encounter start
+        time, or per grid point if ``grid`` is given.
+
+    """
+    order = np.argsort(start_times, kind='mergesort')
+    sorted_starts = np.asarray(start_times)[order]
+    # index of the last encounter at each distinct time.
+    last = np.nonzero(np.append(sorted_starts[1:] != sorted_starts[:-1],
+                                True))[0]
+    times = sorted_starts[last]
+    # index of each pair's earliest encounter.
+    _, first = np.unique(dataset.pair_ids(node_1, node_2)[order],
+                         return_index=True)
+    new_pair = np.zeros(len(order), dtype=np.int64)
+    new_pair[first] = 1
+    if start is None:
+        start = times[0]
+    totals = last + 1
+    uniques = np.cumsum(new_pair)[last]
+    if grid is None:
+        return times - start, totals, uniques
+    return (grid, sampling.sample_steps(times - start, totals, grid),
+            sampling.sample_steps(times - start, uniques, grid))
+
+def _sampled(times, counts, grid):
+    if grid is None:
+        return times, counts
+    return grid, sampling.sample_steps(times, counts, grid)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description='Tally number of encounters.')
@@ -111,15 +246,33 @@ if __name__ == "__main__":
     parser.add_argument('-u', '--unique',
                         help='Count unique encounter pairs only',
                         action='store_true')
+    parser.add_argument('-b', '--both',
+                        help='Print both total and unique encounter ' +\
+                        'counts, from a single sort.', action='store_true')
+    parser.add_argument('-n', '--samples', type=int, default=None,
+                        help='Number of grid samples (requires -d).')
+    parser.add_argument('-d', '--domain', type=float, default=None,
+                        help='Sample the tally at bucket middles of ' +\
+                        'the domain 0 -- <this value>.')
     args = parser.parse_args()
+    grid = None
+    if args.samples and args.domain:
+        grid = sampling.bucket_midpoints(args.domain, args.samples).tolist()
 
     encounters = []
     for line in sys.stdin:
         f = line.strip().split(',')
         encounters.append([f[0], f[1], int(f[2])])
-    if args.unique:
-        res = unique_tally(encounters, args.start)
+    if args.both and not encounters:
+        res = []
+    elif args.both:
+        macs_1, macs_2, starts = zip(*encounters)
+        ids, _ = dataset.intern(macs_1 + macs_2)
+        res = zip(*[np.asarray(a).tolist() for a in tallies_arrays(
+            ids[:len(starts)], ids[len(starts):], starts, args.start, grid)])
+    elif args.unique:
+        res = unique_tally(encounters, args.start, grid)
     else:
-        res = tally(encounters, args.start)
+        res = tally(encounters, args.start, grid)
     for r in res:
         print ','.join(map(str, r))
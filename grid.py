@@ -0,0 +1,48 @@
+"""Fixed sampling grids for simulation curves.
+
+Simulation results such as prevalence and encounter tallies are step
+functions of time.  Sampling them directly onto a common grid lets the
+results of many trials be averaged point by point without a separate
+interpolation pass.
+
+"""
+import numpy as np
+
+
+def bucket_midpoints(domain, samples):
+    """Return the midpoints of equal-width buckets spanning 0 -- domain.
+
+    This is the grid ``interp.py`` samples when given -d, e.g. with samples of
+    10 and domain of 20, the grid is [1, 3, 5, ..., 19].
+
+    """
+    domain = float(domain)
+    return np.linspace(domain / samples * 0.5,
+                       domain - (domain / samples * 0.5), samples)
+
+
+def sample_steps(xs, ys, grid, initial=0):
+    """Sample a step function at a set of points.
+
+    Parameters
+
+        xs : a sorted array of the x-values at which the function changes.
+
+        ys : the function values matched to xs, each holding from its x-value
+        until the next.
+
+        grid : the x-values to sample at.
+
+        initial : the value of the function before xs[0].
+
+    Returns
+
+        An array of the function values at each grid point.
+
+    """
+    xs = np.asarray(xs)
+    ys = np.asarray(ys)
+    idx = np.searchsorted(xs, grid, side='right') - 1
+    if len(ys) == 0:
+        return np.full(len(idx), initial, dtype=float)
+    return np.where(idx >= 0, ys[np.maximum(idx, 0)], initial)
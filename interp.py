@@ -4,12 +4,17 @@ If called as main script:
 
 stdin
 
-    A set of comma-separated x,y pairs, one per line.
+    A set of comma-separated x,y pairs, one per line.  With --batch, a number
+    of such sets separated by blank lines, one set per curve.
 
 stdout
 
     A set of comma-separated x,y pairs, one per line, that result from
-    interpolating between the input points at a linear interval.
+    interpolating between the input points at a linear interval.  With
+    --batch, one such set per input curve, separated by blank lines, or with
+    --average as well, comma-separated <x, average y, count> triplets as per
+    ``avg_y.py``.  Like ``avg_y.py``, --average fails if the curves do not
+    all cover the same samples, unless --partial is given.
 
 flags
 
@@ -66,7 +71,85 @@ def interp(xs, ys, samples=35, kind='linear', domain=None,
                 out_points.append([s, f(s)])
     return out_points
 
-            
+
+def batch_interp(xs, ys, offsets, samples=35, domain=None,
+                 flat_extrapolate=False):
+    """Linearly interpolate many curves at once.
+
+    Parameters
+
+        xs, ys : the points of every curve concatenated into two arrays.
+
+        offsets : a (curves + 1)-length sequence such that the points of curve
+        i are ``xs[offsets[i]:offsets[i + 1]]``.
+
+        samples, domain, flat_extrapolate : as per ``interp``.
+
+    Returns
+
+        A two-tuple <sample_times, values> where values is a (curves x
+        samples) array.  If ``domain`` is given all curves share the sample
+        times and sample_times is a ``samples``-length array, otherwise each
+        curve is sampled between its own min and max x and sample_times is a
+        (curves x samples) array.  Without ``flat_extrapolate``, values outside
+        a curve's range of x are NaN.  Where a curve repeats an x-value, the
+        largest y-value at that x is used.
+
+    """
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    curves = len(offsets) - 1
+    if domain is not None:
+        sample_times = np.linspace(domain/samples * 0.5,
+                                   domain - (domain/samples * 0.5),
+                                   samples)
+    else:
+        sample_times = np.empty((curves, samples))
+    values = np.empty((curves, samples))
+    for i in range(curves):
+        c_xs = xs[offsets[i]:offsets[i + 1]]
+        c_ys = ys[offsets[i]:offsets[i + 1]]
+        order = np.lexsort((c_ys, c_xs))
+        c_xs, c_ys = c_xs[order], c_ys[order]
+        # keep the last of any run of equal x-values.
+        last = np.append(c_xs[1:] != c_xs[:-1], True)
+        c_xs, c_ys = c_xs[last], c_ys[last]
+        if domain is None:
+            sample_times[i] = np.linspace(c_xs[0], c_xs[-1], samples)
+            times = sample_times[i]
+        else:
+            times = sample_times
+        if flat_extrapolate:
+            values[i] = np.interp(times, c_xs, c_ys)
+        else:
+            values[i] = np.interp(times, c_xs, c_ys, left=np.nan,
+                                  right=np.nan)
+    return sample_times, values
+
+
+def read_curves(lines):
+    """Read blank-line separated sets of x,y lines.
+
+    Returns
+
+        A three-tuple <xs, ys, offsets> as ``batch_interp`` accepts.
+
+    """
+    xs, ys, offsets = [], [], [0]
+    for line in lines:
+        line = line.strip()
+        if not line:
+            if len(xs) > offsets[-1]:
+                offsets.append(len(xs))
+            continue
+        x, y = map(float, line.split(','))
+        xs.append(x)
+        ys.append(y)
+    if len(xs) > offsets[-1]:
+        offsets.append(len(xs))
+    return xs, ys, offsets
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description='Interpolate points.')
@@ -84,6 +167,17 @@ if __name__ == "__main__":
     parser.add_argument('-f', '--flat-extrapolate', action='store_true',
                         help='For points either side of the interpolation ' + \
                         'range just use the closest interpolable value.')
+    parser.add_argument('-b', '--batch', action='store_true',
+                        help='Interpolate each blank-line separated curve ' + \
+                        'with linear interpolation.')
+    parser.add_argument('-a', '--average', action='store_true',
+                        help='With --batch and -d, print the average of ' + \
+                        'the curve values at each sample.  Fails if any ' + \
+                        'curve is undefined at a sample, as avg_y.py ' + \
+                        'fails on differing y-counts, unless --partial.')
+    parser.add_argument('-p', '--partial', action='store_true',
+                        help='With --average, average only the curves ' + \
+                        'defined at each sample, so counts may differ.')
     args = parser.parse_args()
     samples = 35
     kind = 'linear'
@@ -95,6 +189,30 @@ if __name__ == "__main__":
     if args.domain:
         domain = args.domain
 
+    if args.batch:
+        xs, ys, offsets = read_curves(sys.stdin)
+        times, values = batch_interp(xs, ys, offsets, samples, domain,
+                                     args.flat_extrapolate)
+        if args.average:
+            if domain is None:
+                parser.error('--average requires -d')
+            counts = np.sum(~np.isnan(values), axis=0)
+            if not args.partial and len(set(counts.tolist())) > 1:
+                print >> sys.stderr, 'different x-vals with different ' + \
+                'y-counts!  Use --partial to average them anyway.'
+                sys.exit(1)
+            avgs = np.nansum(values, axis=0) / counts
+            for r in zip(times.tolist(), avgs.tolist(), counts.tolist()):
+                print ','.join(map(str, r))
+        else:
+            for i, row in enumerate(values):
+                if i:
+                    print
+                row_times = times if domain is not None else times[i]
+                for r in zip(row_times.tolist(), row.tolist()):
+                    print ','.join(map(str, r))
+        sys.exit(0)
+
     xs, ys = [], []
     for line in sys.stdin:
         x, y = map(float, line.strip().split(','))
@@ -40,9 +40,41 @@ SEED=1000
 # Number of trials for any given simulated facet.
 TRIALS=250
 
+# Number of worker processes to spread trials over.  Results do not depend on
+# this value.
+WORKERS=`nproc`
+
+# If true, shuffle the sessions of the contact-count trials with NumPy
+# (session_shuffle.py, or sessions_to_encounters.py --tl-replicas for TL),
+# which parses the sessions once for all trials, rather than with the Go
+# session_shuffle.  The NumPy replicas are different realisations of each
+# shuffle, so the contact-count figures change.
+NUMPY_REPLICAS=false
+
 # If true, prevalence results I(t)/N should use N = |LCC| rather than 
 # N = total nodes (LCC: Largest Connected Component).
 LCC=true
+if [ "$LCC" = true ]; then
+    LCC_FLAG="--lcc"
+else
+    LCC_FLAG=""
+fi
+
+# Cache of shuffled sessions, encounters and trial results, keyed by the input
+# data and parameters, so re-rendering figures skips the simulations.  Delete
+# the directory to start afresh.
+CACHE_DIR="./tmp/cache"
+CACHE_BYTES=`echo -e "8 * 1024 * 1024 * 1024" | bc`
+
+cache_key() {
+    python cache.py key "$@"
+}
+cache_get() {
+    python cache.py -d "${CACHE_DIR}" get "$1"
+}
+cache_put() {
+    python cache.py -d "${CACHE_DIR}" -m ${CACHE_BYTES} put "$1"
+}
 
 # compile Go scripts (faster than using "go run ..." each time).
 go build session_shuffle.go
@@ -51,6 +83,7 @@ go build encounter_count.go
 
 # Read in the St Lucia data
 DATA=`cat st_lucia.csv`
+DATA_KEY=`python cache.py -i st_lucia.csv key st_lucia`
 # Read in all of UQ data
 UQ=`cat uq.csv`
 
@@ -128,6 +161,9 @@ ENQ_FREQ_ECDF_PLOT_INPUT="" # encounter frequency ecdf non-unique plot input.
 ENQ_FREQ_ECDF_PLOT_INPUT_U="" # encounter frequency ecdf unique plot input.
 LOC_ECDF_PER_NODE_PLOT_INPUT="" # unique locations visited per node ecdf input.
 INTERSESS_ECDF_PLOT_INPUT="" # intersession times.
+# ECDFs are cut down to at most this many log-spaced points, so plot input
+# size does not grow with the dataset.
+ECDF_POINTS=1000
 ONE_DAY_PREVS_PLOT_INPUT=""
 PREV_ONE_DAY="" # prevalence at one day.
 for n in ${SESS_SHUFF_FLAGS[@]}; do
@@ -139,28 +175,32 @@ for n in ${SESS_SHUFF_FLAGS[@]}; do
     SEM_PLOT_INPUT+="${SESS_SHUFF_FLAG_LEGEND[${n}]}\n"
     ONE_DAY_PREVS_PLOT_INPUT+="${SESS_SHUFF_FLAG_LEGEND[${n}]}\n"
     
+    SESS_KEY=`cache_key ${DATA_KEY} session_shuffle ${n}`
     if [[ $n == "Original" ]]; then
         SESSNS=`echo -e "$DATA"`
-    else
+    elif ! SESSNS=`cache_get ${SESS_KEY}`; then
         SESSNS=`echo -e "$DATA" | ./session_shuffle $n`
+        echo -e "$SESSNS" | cache_put ${SESS_KEY}
+    fi
+    ENC_KEY=`cache_key ${SESS_KEY} sessions_to_encounters`
+    if ! ENCOUNTERS=`cache_get ${ENC_KEY}`; then
+        ENCOUNTERS=`echo -e "$SESSNS" | ./sessions_to_encounters | \\
+        cut -f 1,2,3 -d ,`
+        echo -e "$ENCOUNTERS" | cache_put ${ENC_KEY}
     fi
-    ENCOUNTERS=`echo -e "$SESSNS" | ./sessions_to_encounters | \\
-    cut -f 1,2,3 -d ,`
     # Total and unique encounters per node.
-    TOT_ENC_FREQ_PER_NODE=`echo -e "$ENCOUNTERS" | cut -f 1,2 -d , | \\
-    tr ',' '\n' | sort | uniq -c | sed -e 's/ *//' -e 's/ /,/' | cut -f 1 -d ,`
-    UNIQ_ENC_FREQ_PER_NODE=`echo -e "$ENCOUNTERS" | cut -f 1,2 -d , | \\
-    python sort_csv.py | sort | uniq | tr ',' '\n' | sort | uniq -c | \\
-    sed -e 's/ *//' -e 's/ /,/' | cut -f 1 -d ,`
+    TOT_ENC_FREQ_PER_NODE=`echo -e "$ENCOUNTERS" | python node_stats.py total`
+    UNIQ_ENC_FREQ_PER_NODE=`echo -e "$ENCOUNTERS" | \\
+    python node_stats.py unique`
     TOT_ENC_FREQ_PER_NODE_ECDF=`echo -e "$TOT_ENC_FREQ_PER_NODE" | \\
-    python ecdf.py`
+    python ecdf.py -m ${ECDF_POINTS} --mode log`
     UNIQ_ENC_FREQ_PER_NODE_ECDF=`echo -e "$UNIQ_ENC_FREQ_PER_NODE" | \\
-    python ecdf.py`
-    INTERSESS_ECDF=`echo -e "$SESSNS" | cut -f 1,2,3 -d , | \\
-    python intersession_times.py | awk '{print "scale=4;" $0 " / 60.0" }' | \\
-    bc | python ecdf.py`
-    #INTERSESS_ECDF=`echo -e "$SESSNS" | cut -f 1,2,3 -d , | \\
-    #python intersession_times.py | python ecdf.py`
+    python ecdf.py -m ${ECDF_POINTS} --mode log`
+    # intersession times in minutes.  A node's overlapping sessions give
+    # zero or negative gaps.  They count towards the ECDF but are not drawn
+    # on its log x-axis, so the drawn curve starts above zero.
+    INTERSESS_ECDF=`echo -e "$SESSNS" | python intersession_times.py --ecdf \\
+    -m ${ECDF_POINTS} --mode log`
 
     ENQ_FREQ_ECDF_PLOT_INPUT+="${SESS_SHUFF_FLAG_LEGEND[${n}]}\n"
     ENQ_FREQ_ECDF_PLOT_INPUT+="${TOT_ENC_FREQ_PER_NODE_ECDF}\n"
@@ -168,111 +208,36 @@ for n in ${SESS_SHUFF_FLAGS[@]}; do
     ENQ_FREQ_ECDF_PLOT_INPUT_U+="${UNIQ_ENC_FREQ_PER_NODE_ECDF}\n"
     # Unique locations per node.
     LOC_ECDF_PER_NODE_PLOT_INPUT+="${SESS_SHUFF_FLAG_LEGEND[${n}]}\n"
-    UNIQ_LOC_PER_NODE=`echo -e "$SESSNS" | cut -f 1,4 -d , | \\
-    sort | uniq | cut -f 1 -d , | sort | uniq -c | sed -e 's/ *//' -e 's/ /,/' | \\
-    cut -f 1 -d ,`
+    UNIQ_LOC_PER_NODE=`echo -e "$SESSNS" | python node_stats.py locations`
     LOC_ECDF_PER_NODE_PLOT_INPUT+=`echo -e "$UNIQ_LOC_PER_NODE" | \\
-    python ecdf.py`
+    python ecdf.py -m ${ECDF_POINTS} --mode log`
     LOC_ECDF_PER_NODE_PLOT_INPUT+="\n"
     INTERSESS_ECDF_PLOT_INPUT+="${SESS_SHUFF_FLAG_LEGEND[${n}]}\n"
     INTERSESS_ECDF_PLOT_INPUT+="${INTERSESS_ECDF}"
     INTERSESS_ECDF_PLOT_INPUT+="\n"
-    FIRST_ENC_TIME=`echo -e "$ENCOUNTERS" | awk -F ',' 'NR == 1 || \\
-    $3 < min {min = $3}END{print min}'`
-    LAST_ENC_TIME=`echo -e "$ENCOUNTERS" | awk -F ',' 'NR == 1 || \\
-    $3 > max {max = $3}END{print max}'`
-    # the latest time a source encounter should be selected to ensure
-    # $RUNWAY of simulation time.
-    SOURCE_CUTOFF=`echo -e "${LAST_ENC_TIME} - ${RUNWAY}" | bc`
-    # source encounter event should be prior to the cutoff time
-    CAND_SOURCE_ENCS=`echo -e "$ENCOUNTERS" | \\
-    awk -v first=$FIRST_ENC_TIME -v last=$SOURCE_CUTOFF -F ',' '$3 >= first && $3 < last'`
-    TRI_RES="" # Trial results.
-    ONE_DAY_PREVS="" # prevalences at one day
-    E_TRI_RES=""
-    E_TRI_RES_U=""
-    for i in $(seq 0 `expr $TRIALS - 1`); do
-        have_source=false
-        while [ "$have_source" = false ]; do
-            MAC_MAC_TIME=`echo -e "$CAND_SOURCE_ENCS" | \\
-            python rand_encounter.py -s $SEED`
-            MAC1=`echo -e "$MAC_MAC_TIME" | cut -f 1 -d ,`
-            MAC2=`echo -e "$MAC_MAC_TIME" | cut -f 2 -d ,`
-            # simulation start and end times
-            START_TIME=`echo -e "$MAC_MAC_TIME" | cut -f 3 -d ,`
-            END_TIME=`echo -e "${START_TIME} + ${RUNWAY}" | bc` 
-            # ENCS should represent the 10-day encounter period starting at the
-            # randomly sampled start event.  i.e. encounters prior to start event
-            # and after 10 days subsequent should be discarded.
-            ENCS=`echo -e "$ENCOUNTERS" | \\
-            awk -v start_time=$START_TIME -v end_time=$END_TIME -F ',' \\
-            '$3 >= start_time && $3 <= end_time'`
-            if [ "$LCC" = true ]; then
-                ENCS=`echo -e "$ENCS" | python cc.py`
-                # recall 0 = true in a bash if statement like this
-                if ! echo -e "$ENCS" | cut -f 1 -d , | \
-                awk -v mac=$MAC1 -F ',' '{if ($1 == mac) {found_mac = 1; exit 0;}} \
-                END {if (found_mac) exit 0; else exit 1;}'; then
-                    echo -e "WARNING: Source MAC not in LCC so resampling."
-                    ((SEED++))
-                else
-                    # all good -- chosen source belongs to LCC
-                    have_source=true
-                fi
-            else
-                # if not restricting ourselves to LCC then don't need to
-                # verify LCC membership.
-                have_source=true
-            fi
-        done
-        THIS_TRI_RES=`echo -e "$ENCS" | python prev.py $START_TIME $MAC1`
-        THIS_ENCOUNTER_COUNT=`echo -e "$ENCS" | ./encounter_count`
-        THIS_ENCOUNTER_COUNT_U=`echo -e "$ENCS" | ./encounter_count -u`
-        # interpolating with -d will has effect of aligning all trials y-results
-        # at same value.  Later on avg_y.py can then be used and results should
-        # be monotonically non-decreasing.
-        THIS_TRI_RES=`echo -e "$THIS_TRI_RES" | \\
-        python interp.py -s 336 -d ${RUNWAY}`
-        THIS_ENCOUNTER_COUNT=`echo -e "$THIS_ENCOUNTER_COUNT" | \\
-        python interp.py -s 336 -d ${RUNWAY}`
-        THIS_ENCOUNTER_COUNT_U=`echo -e "$THIS_ENCOUNTER_COUNT_U" | \\
-        python interp.py -s 336 -d ${RUNWAY}`
-        TRI_RES+=${THIS_TRI_RES}
-        TRI_RES+="\n"
-        ONE_DAY_PREVS_PLOT_INPUT+=`echo -e "$THIS_TRI_RES" | \\
-        python prev_at_time.py 86400 --single-sample`
-        ONE_DAY_PREVS_PLOT_INPUT+="\n"
-        E_TRI_RES+=${THIS_ENCOUNTER_COUNT}
-        E_TRI_RES+="\n"
-        E_TRI_RES_U+=${THIS_ENCOUNTER_COUNT_U}
-        E_TRI_RES_U+="\n"
-        ((SEED++))
-    done
-    
-    # prevalence and encounter count y-values
-    P_YS=`echo -e -n "$TRI_RES" | python avg_y.py | cut -f 1,2 -d ,`
-    E_YS=`echo -e -n "$E_TRI_RES" | python avg_y.py | cut -f 1,2 -d ,`
-    E_V_P=`paste -d , <(echo -e "$E_YS" | cut -f 2 -d ,) \\
-    <(echo -e "$P_YS" | cut -f 2 -d ,)`
-    E_PLOT_INPUT+=`echo -e "$E_V_P"`
+    # Sample sources, cut simulation windows, simulate prevalence and tally
+    # encounters for all trials in a single process.
+    TRIALS_PREFIX="./tmp/ssr_prev_${n}"
+    echo -e "$ENCOUNTERS" | python prev_trials.py -t ${TRIALS} -r ${RUNWAY} \
+    -s ${SEED} -f ${n} -w ${WORKERS} -n 336 ${LCC_FLAG} \
+    --cache-dir ${CACHE_DIR} --cache-bytes ${CACHE_BYTES} -o "${TRIALS_PREFIX}"
+    ONE_DAY_PREVS_PLOT_INPUT+=`cat "${TRIALS_PREFIX}.one_day_prevs"`
+    ONE_DAY_PREVS_PLOT_INPUT+="\n"
+
+    E_PLOT_INPUT+=`cat "${TRIALS_PREFIX}.enc_vs_prev"`
     E_PLOT_INPUT+="\n"
 
-    E_YS_U=`echo -e -n "$E_TRI_RES_U" | python avg_y.py | cut -f 1,2 -d ,`
-    E_V_P_U=`paste -d , <(echo -e "$E_YS_U" | cut -f 2 -d ,) \\
-    <(echo -e "$P_YS" | cut -f 2 -d ,)`
-
-    E_PLOT_INPUT_U+=`echo -e "$E_V_P_U"`
+    E_PLOT_INPUT_U+=`cat "${TRIALS_PREFIX}.enc_u_vs_prev"`
     E_PLOT_INPUT_U+="\n"
 
     PREV_ONE_DAY+=`echo -e "${n} "`
-    PREV_ONE_DAY+=`echo -e -n "$TRI_RES" | python stat_y.py -s avg -s sem | \\
-    python prev_at_time.py 86400`
+    PREV_ONE_DAY+=`cat "${TRIALS_PREFIX}.prev_one_day"`
     PREV_ONE_DAY+="\n"
     
-    PLOT_INPUT+=`echo -e -n "$TRI_RES" | python avg_y.py | cut -f 1,2 -d ,`
+    PLOT_INPUT+=`cat "${TRIALS_PREFIX}.prev"`
     PLOT_INPUT+="\n"
 
-    SEM_PLOT_INPUT+=`echo -e -n "$TRI_RES" | python stat_y.py -s avg -s sem`
+    SEM_PLOT_INPUT+=`cat "${TRIALS_PREFIX}.prev_sem"`
     SEM_PLOT_INPUT+="\n"
 done
 # Plot PDF of prevalences at one day.
@@ -285,26 +250,26 @@ pdf_to_eps "${BASE_FILE_NAME}"
 BASE_FILE_NAME="${OUT_DIR}/figs/contacts_per_node_ecdf_total_lcc_${LCC}"
 echo -e -n "$ENQ_FREQ_ECDF_PLOT_INPUT" | python lp.py \
 -x "Total contacts per node" -y "\$P(x \le X)\$" -s "${BASE_FILE_NAME}.pdf" \
---log-x --mark-every=500 -a 0.4 --steps
+--log-x --mark-every=50 -a 0.4 --steps
 pdf_to_eps "${BASE_FILE_NAME}"
 
 BASE_FILE_NAME="${OUT_DIR}/figs/contacts_per_node_ecdf_uniq_lcc_${LCC}"
 echo -e -n "$ENQ_FREQ_ECDF_PLOT_INPUT_U" | python lp.py \
 -x "Unique contacts per node" -y "\$P(x \le X)\$" -s "${BASE_FILE_NAME}.pdf" \
---log-x --mark-every=500 -a 0.4 --steps
+--log-x --mark-every=50 -a 0.4 --steps
 pdf_to_eps "${BASE_FILE_NAME}"
 
 # Plot unique locations per node ECDF.
 BASE_FILE_NAME="${OUT_DIR}/figs/locations_per_node_ecdf_lcc_${LCC}"
 echo -e -n "$LOC_ECDF_PER_NODE_PLOT_INPUT" | python lp.py \
---log-x --steps --mark-every=5000 -a 0.4 \
+--log-x --steps --mark-every=50 -a 0.4 \
 -x "Unique locations visited" -y "\$P(x \le X)\$" -s "${BASE_FILE_NAME}.pdf"
 pdf_to_eps "${BASE_FILE_NAME}"
 
 # Plot intersession time ECDF.
 BASE_FILE_NAME="${OUT_DIR}/figs/intersession_time_ecdf_lcc_${LCC}"
 echo -e -n "$INTERSESS_ECDF_PLOT_INPUT" | python lp.py \
---log-x --steps --mark-every=5000 -a 0.4 -x "Intersession Time (minutes)" \
+--log-x --steps --mark-every=50 -a 0.4 -x "Intersession Time (minutes)" \
 -y "\$P(x \le X)\$" -s "${BASE_FILE_NAME}.pdf"
 pdf_to_eps "${BASE_FILE_NAME}"
 
@@ -361,28 +326,65 @@ for n in ${SESS_SHUFF_FLAGS[@]}; do
     SEED=1000
     PLOT_INPUT_U+="${SESS_SHUFF_FLAG_LEGEND[${n}]}\n"
     PLOT_INPUT_T+="${SESS_SHUFF_FLAG_LEGEND[${n}]}\n"
-    TALLY_U=""
-    TALLY_T=""
-    for i in $(seq 0 `expr $TRIALS - 1`); do
-        if [[ $n == "Original" ]]; then
-            SESSNS=`echo -e "$DATA"`
-        else
-            SESSNS=`echo -e "$DATA" | ./session_shuffle -s $SEED $n`
+    # The averaged <time, total, unique> tallies of all trials are cached
+    # under one key per shuffle.  The original sessions give the same
+    # tallies in every trial, so they are tallied once, whatever the seed.
+    if [[ $n == "Original" ]]; then
+        COUNT_TRIALS=1
+        TALLY_KEY=`cache_key ${DATA_KEY} contact_count ${n} ${SIM_TIME}`
+    else
+        COUNT_TRIALS=${TRIALS}
+        TALLY_KEY=`cache_key ${DATA_KEY} contact_count ${n} ${SIM_TIME} \\
+        ${TRIALS} ${SEED} numpy ${NUMPY_REPLICAS}`
+    fi
+    if ! AVG_TALLIES=`cache_get ${TALLY_KEY}`; then
+        TALLY_U=""
+        TALLY_T=""
+        if [[ $n == "TL" ]] && [ "$NUMPY_REPLICAS" = true ]; then
+            # TL only permutes session nodes, so all replicas share one
+            # session overlap computation.
+            echo -e "$DATA" | python sessions_to_encounters.py \
+            --tl-replicas ${TRIALS} -s ${SEED} -o "./tmp/tl_encounters_%d.csv"
+        elif [[ $n != "Original" ]] && [ "$NUMPY_REPLICAS" = true ]; then
+            # parse the sessions once for all replicas.
+            echo -e "$DATA" | python session_shuffle.py -r ${TRIALS} \
+            -s ${SEED} -w ${WORKERS} -o "./tmp/sessions_${n}_%d.csv" $n
         fi
-        ENCOUNTERS=`echo -e "$SESSNS" | ./sessions_to_encounters \\
-        | cut -f 1,2,3 -d ,`
-        TALLY_U+=`echo -e "$ENCOUNTERS" | ./encounter_count -u\\
-        | python interp.py -s 336 -d ${SIM_TIME}`
-        TALLY_U+="\n"
-        TALLY_T+=`echo -e "$ENCOUNTERS" | ./encounter_count \\
-        | python interp.py -s 336 -d ${SIM_TIME}`
-        TALLY_T+="\n"
-        ((SEED++))
-    done
-    PLOT_INPUT_U+=`echo -e -n "$TALLY_U" | python avg_y.py | cut -f 1,2 -d ,`
-    PLOT_INPUT_U+="\n"
-    PLOT_INPUT_T+=`echo -e -n "$TALLY_T" | python avg_y.py | cut -f 1,2 -d ,`
+        for i in $(seq 0 `expr $COUNT_TRIALS - 1`); do
+            if [[ $n == "Original" ]]; then
+                ENCOUNTERS=`echo -e "$DATA" | ./sessions_to_encounters \\
+                | cut -f 1,2,3 -d ,`
+            elif [[ $n == "TL" ]] && [ "$NUMPY_REPLICAS" = true ]; then
+                ENCOUNTERS=`cut -f 1,2,3 -d , "./tmp/tl_encounters_${SEED}.csv"`
+                rm "./tmp/tl_encounters_${SEED}.csv"
+            elif [ "$NUMPY_REPLICAS" = true ]; then
+                ENCOUNTERS=`./sessions_to_encounters \\
+                < "./tmp/sessions_${n}_${SEED}.csv" | cut -f 1,2,3 -d ,`
+                rm "./tmp/sessions_${n}_${SEED}.csv"
+            else
+                ENCOUNTERS=`echo -e "$DATA" | ./session_shuffle -s $SEED $n \\
+                | ./sessions_to_encounters | cut -f 1,2,3 -d ,`
+            fi
+            # total and unique tallies from one sort of the encounters,
+            # split into one blank-line separated curve per trial.
+            TALLIES=`echo -e "$ENCOUNTERS" | ./encounter_count -b`
+            TALLY_U+=`echo -e "$TALLIES" | cut -f 1,3 -d ,`
+            TALLY_U+="\n\n"
+            TALLY_T+=`echo -e "$TALLIES" | cut -f 1,2 -d ,`
+            TALLY_T+="\n\n"
+            ((SEED++))
+        done
+        AVG_T=`echo -e -n "$TALLY_T" | \\
+        python interp.py -b -a -s 336 -d ${SIM_TIME} | cut -f 1,2 -d ,`
+        AVG_U=`echo -e -n "$TALLY_U" | \\
+        python interp.py -b -a -s 336 -d ${SIM_TIME} | cut -f 2 -d ,`
+        AVG_TALLIES=`paste -d , <(echo -e "$AVG_T") <(echo -e "$AVG_U")`
+        echo -e "$AVG_TALLIES" | cache_put ${TALLY_KEY}
+    fi
+    PLOT_INPUT_T+=`echo -e "$AVG_TALLIES" | cut -f 1,2 -d ,`
     PLOT_INPUT_T+="\n"
+    PLOT_INPUT_U+=`echo -e "$AVG_TALLIES" | cut -f 1,3 -d ,`
+    PLOT_INPUT_U+="\n"
 done
 BASE_FILE_NAME="${OUT_DIR}/figs/${TRIALS}_trials_SSR_contact_count_vs_time_total"
 echo -e -n "$PLOT_INPUT_T" | python lp.py -x "\$t\$ (days)" \
@@ -405,7 +407,11 @@ COLORS=(\#ED2024 \#0B8040 \#15BCBC \#3852A4 \#BCBE32)
 MARKERS=(o d \^ s v)
 # 10 days simulation runway, in seconds.
 RUNWAY=`echo -e "10 * 24 * 60 * 60" | bc`
-ENCOUNTERS=`echo -e "$DATA" | ./sessions_to_encounters`
+ENC_KEY=`cache_key ${DATA_KEY} sessions_to_encounters`
+if ! ENCOUNTERS=`cache_get ${ENC_KEY}`; then
+    ENCOUNTERS=`echo -e "$DATA" | ./sessions_to_encounters`
+    echo -e "$ENCOUNTERS" | cache_put ${ENC_KEY}
+fi
 PLOT_INPUT=""
 PREVALENCE_THRES=0.5
 SHUFF_INDEX=0
@@ -413,75 +419,26 @@ for n in ${SHUFFLES[@]}; do
     SEED=1000
     echo -e "Processing prevalence for shuffle ${n}..."
     TRELLIS_INPUT+="${n},,,${COLORS[$SHUFF_INDEX]}\n"
-    # shuffle according to one of Small But Slow Worlds methods.  
-    SHUF_ENCS=`echo -e "$ENCOUNTERS" | cut -f 1,2,3 -d , | \\
-    python SBSW_shuffle.py ${n}`
-    FIRST_ENC_TIME=`echo -e "$SHUF_ENCS" | awk -F ',' 'NR == 1 || \\
-    $3 < min {min = $3}END{print min}'`
-    LAST_ENC_TIME=`echo -e "$SHUF_ENCS" | awk -F ',' 'NR == 1 || \\
-    $3 > max {max = $3}END{print max}'`
-    # the latest time a source encounter should be selected to ensure
-    # $RUNWAY of simulation time.
-    SOURCE_CUTOFF=`echo -e "${LAST_ENC_TIME} - ${RUNWAY}" | bc`
-    # source encounter event should be prior to the cutoff time
-    CAND_SOURCE_ENCS=`echo -e "$SHUF_ENCS" | \\
-    awk -v first=$FIRST_ENC_TIME -v last=$SOURCE_CUTOFF -F ',' '$3 >= first && $3 < last'`
-    TRI_RES="" # Trial results.
-    for i in $(seq 0 `expr $TRIALS - 1`); do
-        have_source=false
-        while [ "$have_source" = false ];do
-            MAC_MAC_TIME=`echo -e "$CAND_SOURCE_ENCS" | \\
-            python rand_encounter.py -s $SEED`
-            MAC1=`echo -e "$MAC_MAC_TIME" | cut -f 1 -d ,`
-            MAC2=`echo -e "$MAC_MAC_TIME" | cut -f 2 -d ,`
-            START_TIME=`echo -e "$MAC_MAC_TIME" | cut -f 3 -d ,`
-            END_TIME=`echo -e "${START_TIME} + ${RUNWAY}" | bc`
-            # ENCS should represent the 10-day encounter period starting at the
-            # randomly sampled start event.  i.e. encounters prior to start event
-            # and after 10 days subsequent should be discarded.
-            ENCS=`echo -e "$SHUF_ENCS" | \\
-            awk -v start_time=$START_TIME -v end_time=$END_TIME -F ',' \\
-            '$3 >= start_time && $3 <= end_time'`
-            if [ "$LCC" = true ]; then
-                ENCS=`echo -e "$ENCS" | python cc.py`
-                # recall 0 = true in a bash if statement like this
-                if ! echo -e "$ENCS" | cut -f 1 -d , | \
-                awk -v mac=$MAC1 -F ',' '{if ($1 == mac) {found_mac = 1; exit 0;}} \
-                END {if (found_mac) exit 0; else exit 1;}'; then
-                    echo -e "WARNING: Source MAC not in LCC so resampling."
-                    ((SEED++))
-                else
-                    # all good -- chosen source belongs to LCC
-                    have_source=true
-                fi
-            else
-                # if not restricting ourselves to LCC then don't need to
-                # verify LCC membership.
-                have_source=true
-            fi
-        done
-        THIS_TRI_RES=`echo -e "$ENCS" | \\
-        python prev.py $START_TIME $MAC1`
-        # interpolating with -d will has effect of aligning all trials y-results
-        # at same value.  Later on avg_y.py can then be used and results should
-        # be monotonically non-decreasing.
-        THIS_TRI_RES=`echo -e "$THIS_TRI_RES" | \\
-        python interp.py -s 336 -d ${RUNWAY}`
-        TRI_RES+=${THIS_TRI_RES}
-        TRI_RES+="\n"
-        ((SEED++))
-    done
+    # every trial runs over its own network, shuffled by prev_trials.py
+    # according to one of Small But Slow Worlds methods.
+    SHUFFLE_ARGS=()
+    if [[ $n != "Original" ]]; then
+        SHUFFLE_ARGS=(--shuffle ${n})
+    fi
+    TRIALS_PREFIX="./tmp/sbsw_prev_${n}"
+    echo -e "$ENCOUNTERS" | cut -f 1,2,3 -d , | \
+    python prev_trials.py -t ${TRIALS} -r ${RUNWAY} \
+    -s ${SEED} -f ${n} -w ${WORKERS} -n 336 ${LCC_FLAG} "${SHUFFLE_ARGS[@]}" \
+    --cache-dir ${CACHE_DIR} --cache-bytes ${CACHE_BYTES} -o "${TRIALS_PREFIX}"
     # label and color
     PLOT_INPUT+="${n},,,${COLORS[$SHUFF_INDEX]},${MARKERS[$SHUFF_INDEX]}\n"
-    PLOT_INPUT+=`echo -e -n "$TRI_RES" | python avg_y.py | cut -f 1,2 -d ,`
+    PLOT_INPUT+=`cat "${TRIALS_PREFIX}.prev"`
     PLOT_INPUT+="\n"
     # MUST pre-increment.  See http://stackoverflow.com/q/7247279/129475
     ((++SHUFF_INDEX))
 done
 BASE_FILE_NAME="${OUT_DIR}/figs/${TRIALS}_trials_SBSW_prev_vs_time_lcc_${LCC}"
-# TODO: come up with a cleaner fix for removing the nans induced by not being
-# able to linearly interpolate at time zero point zero.
-echo -e -n "$PLOT_INPUT" | awk -F ',' '$2 != "nan"' | \
+echo -e -n "$PLOT_INPUT" | \
 python lp.py -x "\$t\$ (in days)" -y "\$|I(t)|/N\$" -s "${BASE_FILE_NAME}.pdf" -c
 pdf_to_eps "${BASE_FILE_NAME}"
 
@@ -0,0 +1,124 @@
+"""Per-node contact and location statistics.
+
+Counts are computed with ``np.bincount`` and ``np.unique`` over interned
+integer node, pair and location ids rather than by sorting text records, and
+are returned as arrays ready for ``ecdf.ecdf``.
+
+If called as main script:
+
+stdin
+
+    For the "total" and "unique" statistics, encounter records, one per line,
+    of the form <mac1, mac2, ...>.  For the "locations" statistic, session
+    records, one per line, of the form <node, start, end, location>.
+
+stdout
+
+    One count per line for each node that appears in the input, in node name
+    order.
+
+positional parameters
+
+    stat : one of "total" (contacts per node), "unique" (distinct contacted
+    nodes per node) or "locations" (distinct locations visited per node).
+
+"""
+import sys
+import argparse
+import numpy as np
+import dataset
+
+STATS = ['total', 'unique', 'locations']
+
+
+def _counts(nodes, num_nodes):
+    return np.bincount(nodes, minlength=num_nodes or 0)
+
+
+def contact_counts(node_1, node_2, num_nodes=None):
+    """Count the contacts of each node.
+
+    Parameters
+
+        node_1, node_2 : equal-length integer arrays, where each index is a
+        contact between node_1[i] and node_2[i].
+
+        num_nodes : the length of the returned array.  Defaults to one more
+        than the largest node id.
+
+    Returns
+
+        An int64 array indexed by node id.  Nodes without contacts count
+        zero, so select ``counts[counts > 0]`` for the ECDF over nodes in
+        contact.
+
+    """
+    return _counts(np.concatenate([node_1, node_2]), num_nodes)
+
+
+def unique_contact_counts(node_1, node_2, num_nodes=None):
+    """Count the distinct nodes each node has contacted.
+
+    Parameters
+
+        node_1, node_2, num_nodes : as per ``contact_counts``.
+
+    Returns
+
+        An int64 array indexed by node id.
+
+    """
+    low, high = dataset.unpack_pair_ids(
+        np.unique(dataset.pair_ids(node_1, node_2)))
+    return _counts(np.concatenate([low, high]), num_nodes)
+
+
+def location_counts(node, ap, num_nodes=None):
+    """Count the distinct locations each node has visited.
+
+    Parameters
+
+        node, ap : equal-length integer arrays of session node and location
+        ids.
+
+        num_nodes : as per ``contact_counts``.
+
+    Returns
+
+        An int64 array indexed by node id.
+
+    """
+    # one int64 per distinct <node, location> visit, node in the high word.
+    visits = np.unique((np.asarray(node, dtype=np.int64) << 32) |
+                       np.asarray(ap, dtype=np.int64))
+    return _counts(visits >> 32, num_nodes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='See module description.')
+    parser.add_argument('stat', type=str, choices=STATS,
+                        help='The per-node statistic to output.')
+    args = parser.parse_args()
+
+    firsts, seconds = [], []
+    for line in sys.stdin:
+        if not line.strip():
+            # e.g. the single empty line of echo -e "" for no encounters.
+            continue
+        f = line.strip().split(',')
+        firsts.append(f[0])
+        seconds.append(f[1] if args.stat != 'locations' else f[3])
+    if args.stat == 'locations':
+        node, _ = dataset.intern(firsts)
+        ap, _ = dataset.intern(seconds)
+        counts = location_counts(node, ap)
+    else:
+        ids, _ = dataset.intern(firsts + seconds)
+        node_1, node_2 = ids[:len(firsts)], ids[len(firsts):]
+        if args.stat == 'total':
+            counts = contact_counts(node_1, node_2)
+        else:
+            counts = unique_contact_counts(node_1, node_2)
+    # every interned node appears in the input, so has a non-zero count.
+    for c in counts.tolist():
+        print c
@@ -19,11 +19,19 @@ flags
     start : a timestamp to consider as time "0" i.e. this value will be
     sutracted from all prevalence times.
 
+Notes
+
+    The script simulates diffusion with ``infection_times``, which resolves
+    chains of contacts sharing a timestamp exactly.
+
 """
 import sys
 import argparse
 from operator import itemgetter
 from collections import deque
+import numpy as np
+import dataset
+import grid as sampling
 
 def contacts_to_prevalence_events(contacts, source):
     """Calculate prevalence events from contacts.
@@ -116,6 +124,291 @@ def now_infected(contact_nodes, currently_infected):
     return currently_infected
 
 
+NOT_INFECTED = -1 # infection time of nodes the source never reaches.
+
+
+class UnionFind(object):
+    """A union-find (disjoint set) over hashable items.
+
+    Items are added the first time ``find`` or ``union`` sees them.  Unions
+    are by size and finds compress paths.  Iterating yields every item seen.
+
+    """
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def __contains__(self, x):
+        return x in self.parent
+
+    def __iter__(self):
+        return iter(self.parent)
+
+    def find(self, x):
+        parent = self.parent
+        if x not in parent:
+            parent[x] = x
+            self.size[x] = 1
+            return x
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        # path compression
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        """Join the sets of a and b and return the root of the result."""
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return a
+
+
+def infection_times(node_1, node_2, times, source, start=None,
+                    num_nodes=None):
+    """Calculate the time at which each node is infected from one source.
+
+    Contacts are swept once in time order, a timestamp at a time.  Contacts
+    sharing a timestamp are simultaneous: a small union-find over that
+    timestamp's contacts finds the groups of nodes they connect, and every
+    node in a group holding an already infected node is infected at that
+    timestamp.
+
+    Parameters
+
+        node_1, node_2, times : equal-length arrays where index i describes a
+        contact between integer node ids node_1[i] and node_2[i] at times[i].
+
+        source : the node id of the source.
+
+        start : the time the source is infected.  Contacts before it are
+        ignored.  Defaults to the time of the first contact.
+
+        num_nodes : the length of the returned array.  Defaults to one more
+        than the largest node id.
+
+    Returns
+
+        An int64 array indexed by node id holding each node's infection time,
+        or ``NOT_INFECTED`` for nodes the source never reaches.
+
+    """
+    times = np.asarray(times)
+    order = np.argsort(times, kind='mergesort')
+    if start is not None:
+        order = order[times[order] >= start]
+    node_1 = np.asarray(node_1)[order].tolist()
+    node_2 = np.asarray(node_2)[order].tolist()
+    times = times[order].tolist()
+    if num_nodes is None:
+        num_nodes = max(node_1 + node_2 + [source]) + 1
+    infected_at = [NOT_INFECTED] * num_nodes
+    infected_at[source] = start if start is not None else \
+                          (times[0] if times else 0)
+    num_contacts = len(times)
+    i = 0
+    while i < num_contacts:
+        now = times[i]
+        j = i + 1
+        while j < num_contacts and times[j] == now:
+            j += 1
+        if j - i == 1:
+            a, b = node_1[i], node_2[i]
+            if (infected_at[a] == NOT_INFECTED) != \
+               (infected_at[b] == NOT_INFECTED):
+                if infected_at[a] == NOT_INFECTED:
+                    infected_at[a] = now
+                else:
+                    infected_at[b] = now
+        else:
+            groups = UnionFind()
+            for k in range(i, j):
+                groups.union(node_1[k], node_2[k])
+            infected_roots = set(groups.find(n) for n in groups
+                                 if infected_at[n] != NOT_INFECTED)
+            if infected_roots:
+                for n in list(groups):
+                    if infected_at[n] == NOT_INFECTED and \
+                       groups.find(n) in infected_roots:
+                        infected_at[n] = now
+        i = j
+    return np.array(infected_at, dtype=np.int64)
+
+
+def prevalence_from_infection_times(infected_at, population=None, grid=None):
+    """Convert infection times to a prevalence curve.
+
+    Parameters
+
+        infected_at : an array of infection times as returned by
+        ``infection_times``.
+
+        population : the number of nodes to divide infection counts by.
+        Defaults to the length of ``infected_at``.
+
+        grid : if not None, an array of times to sample the prevalence at.
+
+    Returns
+
+        A two-tuple <times, prevalences> of arrays with one element per
+        distinct infection time, or per grid point if ``grid`` is given.
+
+    """
+    if population is None:
+        population = len(infected_at)
+    infected_at = np.sort(infected_at[infected_at != NOT_INFECTED])
+    times, last = np.unique(infected_at[::-1], return_index=True)
+    prevalences = (len(infected_at) - last) / float(population)
+    if grid is not None:
+        return grid, sampling.sample_steps(times, prevalences, grid)
+    return times, prevalences
+
+
+def multi_source_prevalence(node_1, node_2, times, sources, starts,
+                            population=None, until=None, grid=None):
+    """Calculate prevalence curves for many sources in one sweep.
+
+    Every node carries a bitmask with one bit per source, stored as a row of
+    uint64 words.  A source's bit is set on its node at the source's start
+    time, and each contact ORs together the masks of its two nodes.  As in
+    ``now_infected``, contacts sharing a timestamp are simultaneous, so at
+    each timestamp masks are propagated until no mask changes, i.e. infection
+    passes transitively along chains of concurrent contacts.
+
+    Parameters
+
+        node_1, node_2, times : equal-length arrays where index i describes a
+        contact between integer node ids node_1[i] and node_2[i] at times[i].
+
+        sources : an array of source node ids, one per simulated diffusion.
+
+        starts : an array of start times matched to sources.  Contacts before
+        a source's start time do not spread it.
+
+        population : the number of nodes to divide infection counts by, either
+        a scalar or an array matched to sources.  Defaults to the number of
+        distinct nodes in the contacts.
+
+        until : if not None, contacts after this time are ignored.
+
+        grid : if not None, an array of elapsed times (relative to each
+        source's start time) to sample every source's prevalence at.
+
+    Returns
+
+        A list with one two-tuple <times, prevalences> of arrays per source.
+        The first element is at the source's start time and subsequent
+        elements are at the times the source's prevalence changed, so the
+        prevalence at any time is that of the latest element at or before it.
+
+        If ``grid`` is given, instead a 2-d array with one row per source
+        holding its prevalence at each grid point.
+
+    """
+    node_1 = np.asarray(node_1)
+    node_2 = np.asarray(node_2)
+    times = np.asarray(times)
+    sources = np.asarray(sources)
+    starts = np.asarray(starts)
+    num_sources = len(sources)
+    if population is None:
+        population = len(np.union1d(node_1, node_2))
+    population = np.broadcast_to(np.asarray(population, dtype=float),
+                                 (num_sources,))
+    order = np.argsort(times, kind='mergesort')
+    if until is not None:
+        order = order[times[order] <= until]
+    node_1, node_2, times = node_1[order], node_2[order], times[order]
+    num_nodes = 0
+    if len(times) > 0:
+        num_nodes = int(max(node_1.max(), node_2.max())) + 1
+    num_nodes = max(num_nodes, int(sources.max()) + 1 if num_sources else 0)
+    num_words = (num_sources + 63) // 64
+    masks = np.zeros((num_nodes, num_words), dtype=np.uint64)
+    counts = np.zeros(num_sources, dtype=np.int64)
+    # <time, source, infected count> each time a source's count changes.
+    events = []
+    source_order = np.argsort(starts, kind='mergesort').tolist()
+    next_source = 0
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(times)) + 1,
+                             [len(times)]]).tolist()
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        now = times[lo]
+        # seed sources starting at or before this timestamp.
+        while next_source < num_sources and \
+              starts[source_order[next_source]] <= now:
+            s = source_order[next_source]
+            masks[sources[s], s // 64] |= np.uint64(1) << np.uint64(s % 64)
+            counts[s] = 1
+            events.append((starts[s], s, 1))
+            next_source += 1
+        a, b = node_1[lo:hi], node_2[lo:hi]
+        mask_a, mask_b = masks[a], masks[b]
+        if not (mask_a.any() or mask_b.any()):
+            continue
+        nodes = np.union1d(a, b)
+        before = masks[nodes]
+        while True:
+            merged = mask_a | mask_b
+            if (merged == mask_a).all() and (merged == mask_b).all():
+                break
+            np.bitwise_or.at(masks, a, merged)
+            np.bitwise_or.at(masks, b, merged)
+            mask_a, mask_b = masks[a], masks[b]
+        gained = masks[nodes] & ~before
+        if not gained.any():
+            continue
+        new = _bit_counts(gained, num_sources)
+        for s in np.flatnonzero(new).tolist():
+            counts[s] += new[s]
+            events.append((now, s, counts[s]))
+    # sources starting after the last contact.
+    for s in source_order[next_source:]:
+        events.append((starts[s], s, 1))
+
+    source_times = [[] for _ in range(num_sources)]
+    source_counts = [[] for _ in range(num_sources)]
+    for time, s, count in events:
+        if source_times[s] and source_times[s][-1] == time:
+            source_counts[s][-1] = count
+        else:
+            source_times[s].append(time)
+            source_counts[s].append(count)
+    curves = [(np.array(t), np.array(c) / population[s]) for s, (t, c) in
+              enumerate(zip(source_times, source_counts))]
+    if grid is None:
+        return curves
+    grid = np.asarray(grid)
+    return np.array([sampling.sample_steps(t, p, starts[s] + grid)
+                     for s, (t, p) in enumerate(curves)]).reshape(-1, len(grid))
+
+
+def _bit_counts(words, num_bits):
+    """Count the set bits of each bit position over the rows of ``words``.
+
+    Parameters
+
+        words : a 2-d uint64 array where bit j of word w in a row represents
+        bit position 64 * w + j.
+
+    Returns
+
+        An array of length ``num_bits`` with the per-position counts.
+
+    """
+    octets = np.ascontiguousarray(words, dtype='<u8').view(np.uint8)
+    # unpackbits is most significant bit first within each byte.
+    bits = np.unpackbits(octets, axis=1)
+    bits = bits.reshape(len(words), -1, 8)[:, :, ::-1]
+    return bits.reshape(len(words), -1).sum(axis=0)[:num_bits]
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('start', type=int, help='A unix integer that should ' +\
@@ -123,11 +416,20 @@ if __name__ == '__main__':
     parser.add_argument('source', type=str, help='The source node name')
     args = parser.parse_args()
     
-    contacts = []
+    macs_1, macs_2, times = [], [], []
     for line in sys.stdin:
         node1, node2, time = line.strip().split(',')
-        time = int(time)
-        contacts.append([node1, node2, time])
-    res = contacts_to_prevalence_events(contacts, args.source)
-    for r in res:
-        print ','.join(map(str, [r[0] - args.start, r[1]]))
+        macs_1.append(node1)
+        macs_2.append(node2)
+        times.append(int(time))
+    ids, macs = dataset.intern(macs_1 + macs_2 + [args.source])
+    node_1, node_2 = ids[:len(times)], ids[len(times):-1]
+    infected_at = infection_times(node_1, node_2, times, ids[-1])
+    infected_at = np.sort(infected_at[infected_at != NOT_INFECTED])
+    # prevalence at each contact timestamp.
+    times = np.unique(times)
+    counts = np.searchsorted(infected_at, times, side='right')
+    num_total_nodes = len(np.union1d(node_1, node_2))
+    for t, count in zip(times.tolist(), counts.tolist()):
+        print ','.join(map(str, [t - args.start,
+                                 float(count) / num_total_nodes]))
@@ -0,0 +1,447 @@
+"""Run repeated prevalence trials over one encounter set in a single process.
+
+Each trial samples a source encounter, cuts the ``runway``-long window of
+encounters starting at it, optionally restricts the window to its largest
+connected component (LCC), simulates ideal diffusion from the source and
+tallies total and unique encounters.  The per-trial curves are sampled
+directly onto a common grid of bucket midpoints and averaged, producing the
+outputs main.sh previously built from per-trial ``rand_encounter.py | cc.py |
+prev.py | interp.py`` pipelines.
+
+Every trial draws from its own random stream, seeded from the base seed, the
+shuffle flag and the trial index, so trials may be spread over any number of
+worker processes without changing the results.
+
+If called as main script:
+
+stdin
+
+    Encounter records, one per line, of the form <mac1, mac2, start>.  Any
+    fields beyond the third are ignored.
+
+output files
+
+    Written with the name given by --out-prefix followed by:
+
+    .prev : <time, average prevalence> lines (``PLOT_INPUT``).
+
+    .prev_sem : <time, average prevalence, standard error> lines
+    (``SEM_PLOT_INPUT``).
+
+    .enc_vs_prev : <average total encounters, average prevalence> lines
+    (``E_PLOT_INPUT``).
+
+    .enc_u_vs_prev : <average unique encounters, average prevalence> lines
+    (``E_PLOT_INPUT_U``).
+
+    .one_day_prevs : one prevalence per trial at --at-time seconds
+    (``ONE_DAY_PREVS_PLOT_INPUT``).
+
+    .prev_one_day : a single <prevalence, error> line at --at-time seconds
+    (``PREV_ONE_DAY``).
+
+flags
+
+    Call the script with -h for more information.  With --cache-dir, trial
+    results are cached under a key of the input encounters and every trial
+    parameter, so re-running with the same input skips the trials.  With
+    --shuffle, each trial runs over its own SBSW-shuffled replica of the
+    encounters (see ``run_shuffled_trials``).
+
+"""
+import sys
+import random
+import hashlib
+import argparse
+import numpy as np
+import prev
+import encounter_count
+import SBSW_shuffle
+from replica_pool import StatePool, shared_state
+from cache import ArtifactCache, digest, make_key
+from grid import bucket_midpoints
+from running_stats import RunningStats
+from rand_encounter import WindowLCCs, rand_lcc_encounter_index
+from dataset import EncounterTimeline
+
+def trial_seed(seed, flag, trial):
+    """Derive the random seed of one trial.
+
+    Parameters
+
+        seed : the base random seed.
+
+        flag : the shuffle flag (e.g. "TL") the trials are being run for.
+
+        trial : the trial index.
+
+    Returns
+
+        A 32-bit integer seed that depends only on the three arguments.
+
+    """
+    digest = hashlib.sha1('%d,%s,%d' % (seed, flag, trial)).hexdigest()
+    return int(digest[:8], 16)
+
+
+def sample_window(timeline, candidates, runway, rng, lcc=True, lccs=None):
+    """Sample a source encounter and cut the simulation window following it.
+
+    Parameters
+
+        timeline : a ``dataset.EncounterTimeline``.
+
+        candidates : the <lo, hi> index range of the timeline encounters a
+        source may be sampled from.
+
+        runway : the simulation duration in seconds.
+
+        rng : a ``random.Random`` instance to sample sources with.
+
+        lcc : if True, restrict the window to its largest connected component
+        and resample until the source belongs to it, as per
+        ``rand_encounter.rand_lcc_encounter_index``.
+
+        lccs : with ``lcc``, the ``rand_encounter.WindowLCCs`` of the timeline
+        and runway to reuse window LCCs from.
+
+    Returns
+
+        A two-tuple <source index, window> where window is a three-tuple of
+        <node_1, node_2, start> arrays.
+
+    """
+    if not lcc:
+        lo, hi = candidates
+        source = lo + int(rng.random() * (hi - lo))
+        start = int(timeline.start[source])
+        return source, timeline.window(start, start + runway)
+    if lccs is None:
+        lccs = WindowLCCs(timeline, runway)
+    source = rand_lcc_encounter_index(lccs, candidates, rng)
+    start = int(timeline.start[source])
+    node_1, node_2, starts = timeline.window(start, start + runway)
+    _, keep = lccs.lcc(start)
+    return source, (node_1[keep], node_2[keep], starts[keep])
+
+
+def _trial(trial):
+    """Sample one trial's source and window and tally its encounters.
+
+    Returns
+
+        A four-tuple <source node, start time, population, [total encounters,
+        unique encounters]> where the encounter counts are arrays sampled at
+        each grid point.
+
+    """
+    s = shared_state('trials')
+    if 'lccs' not in s:
+        # window LCCs are memoised per process.
+        s['lccs'] = WindowLCCs(s['timeline'], s['runway'])
+    timeline, grid = s['timeline'], s['grid']
+    rng = random.Random(trial_seed(s['seed'], s['flag'], trial))
+    source, window = sample_window(timeline, s['candidates'], s['runway'],
+                                   rng, s['lcc'], s['lccs'])
+    node_1, node_2, starts = window
+    _, totals, uniques = encounter_count.tallies_arrays(node_1, node_2, starts,
+                                                        grid=grid)
+    return (int(timeline.node_1[source]), int(timeline.start[source]),
+            len(np.union1d(node_1, node_2)), [totals, uniques])
+
+
+def _windows(timeline, starts, runway):
+    """Return the contacts of the union of the windows following starts.
+
+    Contacts outside every window cannot change any source's prevalence
+    within its window, so a sweep need not visit them.
+
+    Returns
+
+        A three-tuple of <node_1, node_2, start> arrays in time order.
+
+    """
+    ranges = []
+    for start in sorted(set(starts)):
+        lo, hi = timeline.bounds(start, start + runway)
+        if ranges and lo <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], hi)
+        else:
+            ranges.append([lo, hi])
+    columns = zip(*[timeline.slice(lo, hi) for lo, hi in ranges])
+    return tuple(np.concatenate(c) for c in columns)
+
+
+def _prevalence(chunk):
+    """Simulate the diffusion of a chunk of trials in a single sweep.
+
+    Restricting a trial to its window LCC does not change who its source
+    infects, only the population, so all trials share the timeline contacts.
+
+    Returns
+
+        A two-tuple <prevalences, stats> where prevalences holds one row of
+        grid samples per trial and stats is their ``RunningStats``.
+
+    """
+    s = shared_state('trials')
+    sources, starts, populations = chunk
+    node_1, node_2, times = _windows(s['timeline'], starts, s['runway'])
+    prevalences = prev.multi_source_prevalence(node_1, node_2, times, sources,
+                                               starts, populations,
+                                               grid=s['grid'])
+    stats = RunningStats(s['grid'].tolist())
+    stats.add_rows(s['grid'].tolist(), prevalences)
+    return prevalences, stats
+
+
+def run_trials(timeline, trials, runway, seed=1000, flag='', samples=336,
+               lcc=True, workers=1):
+    """Run ``trials`` prevalence trials over one encounter set.
+
+    Trials are first sampled independently, then all of their diffusions are
+    simulated together by ``prev.multi_source_prevalence``.
+
+    Parameters
+
+        timeline : a ``dataset.EncounterTimeline`` of the encounters.
+
+        trials : the number of trials, or a list of the indices of the trials
+        to run (from which their seeds are derived).
+
+        runway : the simulation duration in seconds.
+
+        seed, flag : the base seed and shuffle flag from which each trial's
+        seed is derived (see ``trial_seed``).
+
+        samples : the number of grid samples per trial.
+
+        lcc : whether to restrict trials to the window LCC.
+
+        workers : the number of worker processes to spread trials over.  The
+        results do not depend on this value.
+
+    Returns
+
+        A three-tuple <grid, prevalences, stats>.  grid holds the ``samples``
+        elapsed times each trial is sampled at, prevalences is a (trials x
+        samples) array in trial order and stats is a list of ``RunningStats``
+        over the grid for <prevalence, total encounters, unique encounters>.
+
+    """
+    trial_ids = range(trials) if isinstance(trials, int) else list(trials)
+    trials = len(trial_ids)
+    state = {'timeline': timeline,
+             'candidates': timeline.candidate_bounds(runway),
+             'runway': runway, 'seed': seed, 'flag': flag,
+             'grid': bucket_midpoints(runway, samples), 'lcc': lcc}
+    pool = StatePool('trials', state, workers)
+    try:
+        sampled = pool.map(_trial, trial_ids)
+        # one sweep per worker, packing whole 64-bit words of sources only
+        # once every worker has a word's worth; smaller sweeps use part of a
+        # word.  Sweeps take trials in start order, so each covers the
+        # windows of nearby sources rather than most of the trace.
+        per_sweep = max(1, -(-trials // max(1, workers)))
+        if trials >= 64 * max(1, workers):
+            per_sweep = 64 * -(-per_sweep // 64)
+        order = sorted(range(trials), key=lambda i: sampled[i][1])
+        chunks = []
+        for i in range(0, trials, per_sweep):
+            sources, starts, populations = zip(
+                *[sampled[j] for j in order[i:i + per_sweep]])[:3]
+            chunks.append((sources, starts, populations))
+        swept = pool.map(_prevalence, chunks)
+    finally:
+        pool.close()
+    xs = state['grid'].tolist()
+    stats = [RunningStats(xs), RunningStats(xs), RunningStats(xs)]
+    for _, chunk_stats in swept:
+        stats[0].merge(chunk_stats)
+    for _, _, _, tallies in sampled:
+        stats[1].add_rows(xs, tallies[0])
+        stats[2].add_rows(xs, tallies[1])
+    prevalences = np.empty((trials, len(xs)))
+    prevalences[order] = np.concatenate([p for p, _ in swept])
+    return state['grid'], prevalences, stats
+
+
+def _shuffled_trial(trial):
+    s = shared_state('shuffled_trials')
+    # a distinct tag, so the replica is not shuffled with the seed the trial
+    # samples its source with.
+    replica_seed = trial_seed(s['seed'], s['flag'] + ':shuffle', trial)
+    for _, shuffled in SBSW_shuffle.replicas(s['encounters'], s['method'],
+                                             [replica_seed]):
+        timeline = EncounterTimeline(*(tuple(shuffled) + (s['macs'],)))
+    return run_trials(timeline, [trial], s['runway'], s['seed'], s['flag'],
+                      s['samples'], s['lcc'])
+
+
+def run_shuffled_trials(encounters, macs, method, trials, runway, seed=1000,
+                        flag='', samples=336, lcc=True, workers=1):
+    """Run prevalence trials, each over its own shuffled encounter set.
+
+    Trial i runs as per ``run_trials``, but over the replica of the
+    encounters that ``SBSW_shuffle.replicas`` shuffles with seed
+    ``trial_seed(seed, flag + ':shuffle', i)``, so no two trials share a
+    shuffled network and no trial shuffles with its own sampling seed.
+    Each worker shuffles its own replicas from one parse of the encounters.
+
+    Parameters
+
+        encounters : a three-tuple of <node_1, node_2, start> arrays, as
+        returned by ``SBSW_shuffle.read_encounters``.
+
+        macs : the list of node names in id order.
+
+        method : an SBSW shuffling acronym, e.g. "DCW".
+
+        trials, runway, seed, flag, samples, lcc, workers : as per
+        ``run_trials``, except that trials must be a number.
+
+    Returns
+
+        As per ``run_trials``.
+
+    """
+    state = {'encounters': encounters, 'macs': macs, 'method': method,
+             'runway': runway, 'seed': seed, 'flag': flag,
+             'samples': samples, 'lcc': lcc}
+    pool = StatePool('shuffled_trials', state, workers)
+    try:
+        results = pool.map(_shuffled_trial, range(trials))
+    finally:
+        pool.close()
+    grid = bucket_midpoints(runway, samples)
+    xs = grid.tolist()
+    stats = [RunningStats(xs), RunningStats(xs), RunningStats(xs)]
+    for _, _, trial_stats in results:
+        for running, other in zip(stats, trial_stats):
+            running.merge(other)
+    return grid, np.concatenate([p for _, p, _ in results]), stats
+
+
+def summarise(grid, prevalences, stats, at_time):
+    """Aggregate trial results into the plot inputs ``main.sh`` consumes.
+
+    Parameters
+
+        grid, prevalences, stats : trial results as returned by
+        ``run_trials``.
+
+        at_time : the elapsed time, in seconds, to report prevalence at.
+
+    Returns
+
+        A dictionary keyed by output file suffix where each value is a list of
+        output lines.
+
+    """
+    p_stats, e_stats, u_stats = stats
+    p_rows = p_stats.rows(['avg', 'sem'])
+    e_rows = e_stats.rows(['avg'])
+    u_rows = u_stats.rows(['avg'])
+    outputs = {}
+    outputs['prev'] = [','.join(map(str, r[:2])) for r in p_rows]
+    outputs['prev_sem'] = [','.join(map(str, r)) for r in p_rows]
+    outputs['enc_vs_prev'] = [','.join(map(str, [e[1], p[1]]))
+                              for e, p in zip(e_rows, p_rows)]
+    outputs['enc_u_vs_prev'] = [','.join(map(str, [u[1], p[1]]))
+                                for u, p in zip(u_rows, p_rows)]
+    outputs['one_day_prevs'] = [str(float(np.interp(at_time, grid, ys)))
+                                for ys in prevalences]
+    xs, avgs, sems = zip(*p_rows)
+    outputs['prev_one_day'] = [','.join(map(str, [
+        float(np.interp(at_time, xs, avgs)),
+        float(np.interp(at_time, xs, sems))]))]
+    return outputs
+
+
+STAT_NAMES = ['prev', 'total', 'unique']
+
+
+def results_to_arrays(grid, prevalences, stats):
+    """Flatten ``run_trials`` results into named arrays for caching."""
+    arrays = {'grid': grid, 'prevalences': prevalences}
+    for name, running in zip(STAT_NAMES, stats):
+        for field, a in zip(['xs', 'count', 'mean', 'm2'], running.arrays()):
+            arrays['%s_%s' % (name, field)] = a
+    return arrays
+
+
+def results_from_arrays(arrays):
+    """Invert ``results_to_arrays``."""
+    stats = [RunningStats.from_arrays(*[arrays['%s_%s' % (name, field)] for
+                                        field in ['xs', 'count', 'mean', 'm2']])
+             for name in STAT_NAMES]
+    return arrays['grid'], arrays['prevalences'], stats
+
+
+def write_outputs(outputs, prefix):
+    for suffix, lines in outputs.iteritems():
+        with open('%s.%s' % (prefix, suffix), 'w') as f:
+            for line in lines:
+                print >> f, line
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='See module description.')
+    parser.add_argument('-o', '--out-prefix', type=str, required=True,
+                        help='Path prefix for the output files.')
+    parser.add_argument('-t', '--trials', type=int, default=250,
+                        help='Number of trials.')
+    parser.add_argument('-r', '--runway', type=int, default=10 * 24 * 60 * 60,
+                        help='Simulation duration in seconds.')
+    parser.add_argument('-s', '--seed', type=int, default=1000,
+                        help='Base random seed.')
+    parser.add_argument('-f', '--flag', type=str, default='',
+                        help='Shuffle flag, used in deriving trial seeds.')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of worker processes.')
+    parser.add_argument('-n', '--samples', type=int, default=336,
+                        help='Number of grid samples per trial.')
+    parser.add_argument('--lcc', action='store_true',
+                        help='Restrict each trial to the window LCC.')
+    parser.add_argument('--at-time', type=int, default=24 * 60 * 60,
+                        help='Elapsed time to report prevalence at.')
+    parser.add_argument('--shuffle', type=str, default=None,
+                        help='Run each trial over its own replica of the ' +\
+                        'encounters shuffled with this SBSW_shuffle.py ' +\
+                        'method, e.g. DCW.')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='Directory to cache trial results in.')
+    parser.add_argument('--cache-bytes', type=int, default=None,
+                        help='Size to bound the cache directory to.')
+    args = parser.parse_args()
+
+    lines = sys.stdin.readlines()
+    cache, key, results = None, None, None
+    if args.cache_dir:
+        cache = ArtifactCache(args.cache_dir, args.cache_bytes)
+        data_digest = digest(''.join(lines))
+        # workers is left out as it does not change the results.
+        key = make_key('prev_trials', data_digest,
+                       trials=args.trials, runway=args.runway, seed=args.seed,
+                       flag=args.flag, samples=args.samples, lcc=args.lcc,
+                       shuffle=args.shuffle)
+        arrays = cache.get(key)
+        if arrays is not None:
+            results = results_from_arrays(arrays)
+    if results is None:
+        if args.shuffle:
+            encounters, macs = SBSW_shuffle.read_encounters(
+                [','.join(line.split(',')[:3]) for line in lines])
+            results = run_shuffled_trials(
+                encounters, macs, args.shuffle, args.trials, args.runway,
+                args.seed, args.flag, args.samples, args.lcc, args.workers)
+        else:
+            timeline = EncounterTimeline.from_lines(lines)
+            results = run_trials(timeline, args.trials, args.runway,
+                                 args.seed, args.flag, args.samples, args.lcc,
+                                 args.workers)
+        if cache is not None:
+            cache.put(key, results_to_arrays(*results))
+    grid, prevalences, stats = results
+    write_outputs(summarise(grid, prevalences, stats, args.at_time),
+                  args.out_prefix)
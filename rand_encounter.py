@@ -11,11 +11,20 @@ stdout
 
     A randomly chosen encounter event.
 
+flags
+
+    lcc-runway : if given, stdin holds every encounter and the chosen
+    encounter is drawn from those starting at least this many seconds before
+    the last encounter (as per ``prev_trials.py``) whose mac1 belongs to the
+    LCC of the encounters starting within this many seconds of it.
+
 """
 import sys
 import argparse
 from random import choice
 import random
+import cc
+import dataset
 
 def rand_encounter(encounters):
     """Choose random encounter event.
@@ -32,15 +41,123 @@ def rand_encounter(encounters):
     """
     return choice(encounters)
 
+
+def rand_encounter_index(num_encounters):
+    """Choose the index of a random encounter event.
+
+    Draws from the ``random`` module's global state exactly as
+    ``rand_encounter`` does, so that for a given seed the chosen index matches
+    the encounter ``rand_encounter`` would return from the same sequence.
+
+    Parameters
+
+        num_encounters : the number of candidate encounters, e.g. the length
+        of the arrays of a ``dataset.SessionStore``-derived encounter set.
+
+    Returns
+
+        An integer in the range [0, num_encounters).
+
+    """
+    return int(random.random() * num_encounters)
+
+
+class WindowLCCs(object):
+    """Lazily computed LCCs of the windows following encounter start times.
+
+    A window's LCC is only found, with ``cc.lcc_arrays``, the first time it
+    is asked for.  Windows are memoised by the encounters they hold, so
+    consecutive start times whose windows gain and lose no encounter share
+    one computation.
+
+    Parameters
+
+        timeline : a ``dataset.EncounterTimeline``.
+
+        runway : the window duration in seconds.
+
+        max_windows : the number of LCCs to keep.  The memo is emptied when
+        it is full.
+
+    """
+    def __init__(self, timeline, runway, max_windows=256):
+        self.timeline = timeline
+        self.runway = runway
+        self.max_windows = max_windows
+        self._memo = {}
+
+    def lcc(self, start):
+        """Return <in_lcc, keep> of the window starting at start.
+
+        As per ``cc.lcc_arrays`` over the window's contacts, with in_lcc
+        indexed by timeline node id.
+
+        """
+        bounds = self.timeline.bounds(start, start + self.runway)
+        if bounds not in self._memo:
+            if len(self._memo) >= self.max_windows:
+                self._memo.clear()
+            node_1, node_2, _ = self.timeline.slice(*bounds)
+            self._memo[bounds] = cc.lcc_arrays(node_1, node_2,
+                                               self.timeline.num_nodes)
+        return self._memo[bounds]
+
+
+def rand_lcc_encounter_index(lccs, candidates, rng=random):
+    """Choose an encounter whose source is in the LCC of its window.
+
+    Candidates are drawn uniformly and redrawn while the source (the
+    encounter's node_1) is not in the LCC of the window starting at it.  Only
+    the LCCs of windows actually drawn are computed, each at most once.
+
+    Parameters
+
+        lccs : a ``WindowLCCs`` of the timeline to draw from.
+
+        candidates : the <lo, hi> index range of the timeline encounters a
+        source may be drawn from, e.g. ``timeline.candidate_bounds(runway)``.
+
+        rng : a ``random.Random`` instance, or the ``random`` module.
+
+    Returns
+
+        A timeline encounter index.
+
+    """
+    lo, hi = candidates
+    if hi <= lo:
+        raise ValueError('No candidate encounters to choose from')
+    timeline = lccs.timeline
+    while True:
+        source = lo + int(rng.random() * (hi - lo))
+        in_lcc, _ = lccs.lcc(int(timeline.start[source]))
+        if in_lcc[timeline.node_1[source]]:
+            return source
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='See module description.')
     parser.add_argument('-s', '--seed', help='A random seed integer', type=int)
+    parser.add_argument('-l', '--lcc-runway', type=int, default=None,
+                        help='Only choose encounters whose mac1 is in the ' +\
+                        'LCC of the encounters starting within this many ' +\
+                        'seconds of them.  See module description.')
     args = parser.parse_args()
     if not args.seed:
         print >> sys.stderr, 'WARNING: selecting random encounter without ' + \
                              'setting seed.'
     else:
         random.seed(args.seed)
+    if args.lcc_runway is not None:
+        lines = sys.stdin.readlines()
+        timeline = dataset.EncounterTimeline.from_lines(lines)
+        i = rand_lcc_encounter_index(
+            WindowLCCs(timeline, args.lcc_runway),
+            timeline.candidate_bounds(args.lcc_runway))
+        print ','.join([timeline.macs[timeline.node_1[i]],
+                        timeline.macs[timeline.node_2[i]],
+                        str(timeline.start[i])])
+        sys.exit(0)
     encounters = []
     for line in sys.stdin:
         mac1, mac2, enc_start = line.strip().split(',')
@@ -0,0 +1,94 @@
+"""Spread independently seeded replicas and trials over worker processes.
+
+The shuffling scripts parse their input once and then write one shuffled
+replica per seed, and the prevalence trials each run from their own seed.
+Each result depends only on its seed, so the work may be spread over worker
+processes without changing it.  Every worker is handed the parsed input once,
+as the shared state of a ``StatePool``, rather than with every task.
+
+"""
+import multiprocessing
+
+# pool name -> the state shared by its tasks.  Set in each worker process by
+# _init_state so the state is not re-sent with every task.
+_states = {}
+
+
+def _init_state(name, state):
+    _states[name] = state
+
+
+def shared_state(name):
+    """Return the state of the ``StatePool`` named name in this process."""
+    return _states[name]
+
+
+class StatePool(object):
+    """Map functions over tasks in processes that share one state.
+
+    Tasks look the state up with ``shared_state(name)``.  Pools of different
+    names may be nested, e.g. a task of one pool may run a pool of its own in
+    its worker process.
+
+    Parameters
+
+        name : the name the state is shared under.
+
+        state : a picklable dictionary of the data every task reads.
+
+        workers : the number of processes to spread tasks over.  With one,
+        tasks run in this process.  The results do not depend on this value.
+
+    """
+    def __init__(self, name, state, workers=1):
+        self.pool = None
+        if workers <= 1:
+            _init_state(name, state)
+        else:
+            self.pool = multiprocessing.Pool(workers, _init_state,
+                                             (name, state))
+
+    def map(self, func, tasks):
+        """Return the list of func applied to each task, in task order."""
+        if self.pool is None:
+            return map(func, tasks)
+        return self.pool.map(func, tasks, chunksize=1)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+
+
+def _write_replica(seed):
+    s = shared_state('replicas')
+    with open(s['pattern'] % seed, 'w') as f:
+        s['write'](s['replica'](seed), f)
+
+
+def write_replicas(replica, write, seeds, pattern, workers=1):
+    """Write one replica per seed, optionally with a pool of processes.
+
+    Parameters
+
+        replica : a picklable function of a seed returning its replica, e.g.
+        a ``functools.partial`` of a shuffle over the parsed input.
+
+        write : a picklable function of a replica and an open file that
+        writes the replica to the file.
+
+        seeds : an iterable of random seeds, one per replica.
+
+        pattern : the file name of each replica, formatted with its seed,
+        e.g. "tmp/TL_%d.csv".
+
+        workers : the number of processes to spread replicas over.  The files
+        do not depend on this value.
+
+    """
+    pool = StatePool('replicas', {'replica': replica, 'write': write,
+                                  'pattern': pattern}, workers)
+    try:
+        pool.map(_write_replica, seeds)
+    finally:
+        pool.close()
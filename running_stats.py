@@ -0,0 +1,200 @@
+"""Streaming summary statistics of y-values at each of a set of x-values.
+
+Rather than holding every y-value seen at each x (as ``avg_y.py`` and
+``stat_y.py`` do), a ``RunningStats`` keeps only a count, mean and sum of
+squared deviations (M2) per x, updated with Welford's method.  Aggregates built
+separately, e.g. by worker processes, are combined with ``merge``.  NaN
+y-values are skipped.
+
+If called as main script:
+
+stdin
+
+    A set of lines of the form <x,y> (i.e. two comma-separated numeric values
+    per line)
+
+stdout
+
+    A set of lines of the form <x, y-stat1, ..., y-statN> in x order.  By
+    default the stats are the average and count, as output by ``avg_y.py``.
+
+flags
+
+    Call the script with -h for more information.
+
+"""
+import sys
+import argparse
+import numpy as np
+
+STATS = ['avg', 'sem', 'var', 'count']
+
+
+class RunningStats(object):
+    """Running count, mean and M2 of the y-values at each x-value.
+
+    Attributes
+
+        xs : list of x-values in the order they were first seen.
+
+        count, mean, m2 : float arrays matched to xs.
+
+    """
+    def __init__(self, xs=()):
+        self.xs = []
+        self.index = {}
+        # count, mean and M2 are views of the first len(xs) elements of
+        # these, whose capacity doubles as x-values are added.
+        self._count = np.zeros(0)
+        self._mean = np.zeros(0)
+        self._m2 = np.zeros(0)
+        self._indices(xs)
+
+    def __len__(self):
+        return len(self.xs)
+
+    @property
+    def count(self):
+        return self._count[:len(self.xs)]
+
+    @count.setter
+    def count(self, value):
+        self._count = np.array(value, dtype=float)
+
+    @property
+    def mean(self):
+        return self._mean[:len(self.xs)]
+
+    @mean.setter
+    def mean(self, value):
+        self._mean = np.array(value, dtype=float)
+
+    @property
+    def m2(self):
+        return self._m2[:len(self.xs)]
+
+    @m2.setter
+    def m2(self, value):
+        self._m2 = np.array(value, dtype=float)
+
+    def _indices(self, xs):
+        """Return the index of each x-value, adding any not yet seen."""
+        for x in xs:
+            if x not in self.index:
+                self.index[x] = len(self.xs)
+                self.xs.append(x)
+        if len(self.xs) > len(self._count):
+            capacity = max(len(self.xs), 2 * len(self._count))
+            for name in ['_count', '_mean', '_m2']:
+                grown = np.zeros(capacity)
+                old = getattr(self, name)
+                grown[:len(old)] = old
+                setattr(self, name, grown)
+        return np.array([self.index[x] for x in xs], dtype=int)
+
+    def arrays(self):
+        """Return the aggregate as arrays <xs, count, mean, m2>."""
+        return np.array(self.xs), self.count, self.mean, self.m2
+
+    @classmethod
+    def from_arrays(cls, xs, count, mean, m2):
+        """Rebuild an aggregate from the output of ``arrays``."""
+        stats = cls(np.asarray(xs).tolist())
+        stats.count = count
+        stats.mean = mean
+        stats.m2 = m2
+        return stats
+
+    def add(self, x, y):
+        """Add a single <x, y> observation."""
+        if y != y:
+            return
+        i = self._indices([x])[0]
+        self.count[i] += 1
+        delta = y - self.mean[i]
+        self.mean[i] += delta / self.count[i]
+        self.m2[i] += delta * (y - self.mean[i])
+
+    def add_rows(self, xs, rows):
+        """Add one or more y-value rows observed at the same x-values.
+
+        Parameters
+
+            xs : an n-length sequence of x-values.
+
+            rows : an n-length array of y-values, or an (m x n) array holding
+            one row per observation (e.g. per trial).
+
+        """
+        rows = np.atleast_2d(np.asarray(rows, dtype=float))
+        valid = ~np.isnan(rows)
+        count = valid.sum(axis=0).astype(float)
+        safe = np.maximum(count, 1)
+        mean = np.where(valid, rows, 0).sum(axis=0) / safe
+        m2 = np.where(valid, rows - mean, 0) ** 2
+        self._combine(self._indices(xs), count, mean, m2.sum(axis=0))
+
+    def merge(self, other):
+        """Fold another ``RunningStats`` into this one (Chan et al.)."""
+        self._combine(self._indices(other.xs), other.count, other.mean,
+                      other.m2)
+        return self
+
+    def _combine(self, idx, count, mean, m2):
+        n_a = self.count[idx]
+        n = n_a + count
+        safe = np.maximum(n, 1)
+        delta = mean - self.mean[idx]
+        self.mean[idx] += delta * count / safe
+        self.m2[idx] += m2 + delta ** 2 * n_a * count / safe
+        self.count[idx] = n
+
+    def var(self, ddof=0):
+        """Variance at each x (population variance by default, as np.var)."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return self.m2 / (self.count - ddof)
+
+    def sem(self):
+        """Standard error of the mean at each x, as per ``stat_y.sem``."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.sqrt(self.var()) / np.sqrt(self.count)
+
+    def stat(self, name):
+        """Return the named stat (one of ``STATS``) at each x."""
+        if name == 'avg':
+            return self.mean
+        elif name == 'sem':
+            return self.sem()
+        elif name == 'var':
+            return self.var()
+        elif name == 'count':
+            return self.count.astype(int)
+        raise ValueError('Unrecognized stat %s' % name)
+
+    def rows(self, stats=('avg', 'count')):
+        """Return <x, stat1, ..., statN> lists in x order."""
+        columns = [self.stat(s).tolist() for s in stats]
+        results = [[x] + [c[i] for c in columns]
+                   for i, x in enumerate(self.xs)]
+        results.sort()
+        return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='See module description.')
+    parser.add_argument('-s', '--stat', action='append', type=str,
+                        choices=STATS,
+                        help='A stat to output.  May be repeated.  ' + \
+                        'Defaults to avg and count.')
+    args = parser.parse_args()
+    stats = args.stat if args.stat else ['avg', 'count']
+
+    running = RunningStats()
+    for line in sys.stdin:
+        x, y = map(float, line.strip().split(','))
+        running.add(x, y)
+    if len(set(running.count.tolist())) > 1:
+        print >> sys.stderr, 'WARNING: some x-values have more associated ' + \
+        'y-values than others'
+    for r in running.rows(stats):
+        print ','.join(map(str, r))
@@ -0,0 +1,289 @@
+"""Simulate ideal diffusion directly over sessions.
+
+``sessions_to_encounters.py`` followed by ``prev.py`` materialises one contact
+per pair of co-present sessions, which is quadratic in the occupancy of busy
+locations.  The diffusion only needs to know who was co-present with an
+infected node when each encounter started, so this module sweeps the session
+start and end events instead and keeps, per location, the sessions present
+and how many of them belong to infected nodes.  Its cost scales with the
+number of sessions rather than the number of encounters, and it reproduces
+the infection times and prevalence curves of the encounter pipeline exactly.
+
+If called as main script:
+
+stdin
+
+    A set of comma-separated value lines describing sessions, each of the form
+    <node, start, end, location>.
+
+stdout
+
+    Prevalence records, one per line of the form <time, prevalence>, as output
+    by ``prev.py`` for the encounters of the sessions.
+
+flags
+
+    Call the script with -h for more information.
+
+Notes
+
+    An encounter starts when the later of its two sessions starts, so contacts
+    only happen at session arrivals: an arriving session meets every session
+    still present at its location, i.e. every session that started before it
+    (in stable start order) and ends after it starts.  Sessions of the same
+    node never meet.  All contacts at one location and timestamp therefore
+    connect the nodes of the present and arriving sessions, and as in
+    ``prev.infection_times`` infection passes transitively between contacts
+    sharing a timestamp, including between locations through nodes present
+    at more than one of them.
+
+"""
+import sys
+import heapq
+import argparse
+from collections import defaultdict
+import numpy as np
+import dataset
+from prev import NOT_INFECTED, UnionFind
+
+
+def session_infection_times(node, start, end, ap, source, start_time,
+                            end_time=None, num_nodes=None):
+    """Calculate infection times from one source without building encounters.
+
+    Equivalent to ``prev.infection_times`` over the encounters
+    ``sessions_to_encounters_arrays`` returns for the same sessions, keeping
+    those starting between start_time and end_time.
+
+    Parameters
+
+        node, start, end, ap : equal-length arrays describing sessions of the
+        form <node, start, end, location>, with nodes and locations given as
+        integer ids.
+
+        source : the node id of the source.
+
+        start_time : the time the source is infected.  Encounters starting
+        before it are ignored.
+
+        end_time : if not None, encounters starting after this time are
+        ignored.
+
+        num_nodes : the length of the returned array.  Defaults to one more
+        than the largest node id.
+
+    Returns
+
+        A three-tuple <infected_at, contact_times, components>.  infected_at
+        is an int64 array indexed by node id holding each node's infection
+        time, or ``prev.NOT_INFECTED`` for nodes the source never reaches.
+        contact_times is a sorted array of the distinct encounter start times
+        within the window.  components is an int64 array indexed by node id
+        labelling the connected component of each node in the window's
+        contact network, or -1 for nodes without a contact in the window.
+
+    """
+    order = np.argsort(start, kind='mergesort')
+    starts = np.asarray(start)[order]
+    lo = np.searchsorted(starts, start_time, side='left')
+    hi = len(starts) if end_time is None else \
+         np.searchsorted(starts, end_time, side='right')
+    ends = np.asarray(end)[order]
+    # sessions that started before the window but are still present.
+    already = order[:lo][ends[:lo] > start_time]
+    window = order[lo:hi].tolist()
+    starts = starts.tolist()
+    node = np.asarray(node).tolist()
+    end = np.asarray(end).tolist()
+    ap = np.asarray(ap).tolist()
+    if num_nodes is None:
+        num_nodes = max(node + [source]) + 1
+    infected_at = [NOT_INFECTED] * num_nodes
+    infected_at[source] = start_time
+
+    # location -> ids of the sessions present there.
+    present = defaultdict(set)
+    # location -> node -> number of that node's sessions present there.
+    present_nodes = defaultdict(lambda: defaultdict(int))
+    # location -> present sessions of uninfected nodes, and the number of
+    # present sessions of infected nodes.
+    uninfected = defaultdict(set)
+    infected_present = defaultdict(int)
+    # node -> its present sessions, and the nodes with more than one.
+    node_present = defaultdict(set)
+    multi = set()
+    # min heap of [end, session] over all present sessions.
+    departures = []
+    # contact network of the window.  Present sessions that have met anyone
+    # in the window are "joined": all joined sessions at a location belong to
+    # the component of the location's anchor node.
+    network = UnionFind()
+    joined = set()
+    joined_present = defaultdict(int)
+    anchor = {}
+    unjoined = defaultdict(set)
+    contact_times = []
+
+    def arrive(i, is_joined):
+        a, n = ap[i], node[i]
+        present[a].add(i)
+        present_nodes[a][n] += 1
+        if infected_at[n] == NOT_INFECTED:
+            uninfected[a].add(i)
+        else:
+            infected_present[a] += 1
+        node_present[n].add(i)
+        if len(node_present[n]) > 1:
+            multi.add(n)
+        if is_joined:
+            joined.add(i)
+            joined_present[a] += 1
+        else:
+            unjoined[a].add(i)
+        heapq.heappush(departures, [end[i], i])
+
+    def depart(i):
+        a, n = ap[i], node[i]
+        present[a].discard(i)
+        present_nodes[a][n] -= 1
+        if not present_nodes[a][n]:
+            del present_nodes[a][n]
+        if infected_at[n] == NOT_INFECTED:
+            uninfected[a].discard(i)
+        else:
+            infected_present[a] -= 1
+        node_present[n].discard(i)
+        if len(node_present[n]) < 2:
+            multi.discard(n)
+        if i in joined:
+            joined.discard(i)
+            joined_present[a] -= 1
+            if not joined_present[a]:
+                del anchor[a]
+        else:
+            unjoined[a].discard(i)
+
+    def infect(n, now):
+        infected_at[n] = now
+        for i in node_present[n]:
+            a = ap[i]
+            uninfected[a].discard(i)
+            infected_present[a] += 1
+
+    for i in already.tolist():
+        arrive(i, False)
+
+    num_arrivals = len(window)
+    k = 0
+    while k < num_arrivals:
+        now = starts[lo + k]
+        m = k + 1
+        while m < num_arrivals and starts[lo + m] == now:
+            m += 1
+        while departures and departures[0][0] <= now:
+            depart(heapq.heappop(departures)[1])
+        arrivals = defaultdict(list)
+        for i in window[k:m]:
+            arrivals[ap[i]].append(i)
+        # union-find over this timestamp's contacts, where a location's
+        # present sessions are represented by the location (as -1 - id).
+        now_network = UnionFind()
+        joining = set()
+        for a, sessions in arrivals.iteritems():
+            if not present[a]:
+                # arrivals only meet earlier arrivals still present, so those
+                # before the first that lasts beyond now meet nobody.
+                while sessions and end[sessions[0]] <= now:
+                    sessions = sessions[1:]
+                if not sessions:
+                    continue
+            nodes = set(node[i] for i in sessions)
+            if len(present_nodes[a]) < 2 and \
+               len(nodes.union(present_nodes[a])) < 2:
+                # sessions of a single node never meet.
+                continue
+            joining.update(sessions)
+            for n in nodes:
+                now_network.union(-1 - a, n)
+            # update the window's contact network.
+            members = list(nodes) + [node[i] for i in unjoined[a]]
+            if a in anchor:
+                members.append(anchor[a])
+            for n in members:
+                network.union(members[0], n)
+            anchor[a] = members[0]
+            for i in unjoined[a]:
+                joined.add(i)
+                joined_present[a] += 1
+            unjoined[a] = set()
+        if joining:
+            contact_times.append(now)
+            # link locations through nodes present at one and arriving or
+            # present at another.
+            for n in set(node[i] for i in joining) | multi:
+                for i in node_present[n]:
+                    if -1 - ap[i] in now_network:
+                        now_network.union(-1 - ap[i], n)
+            roots = set()
+            for x in now_network:
+                if x >= 0:
+                    if infected_at[x] != NOT_INFECTED:
+                        roots.add(now_network.find(x))
+                elif infected_present[-1 - x]:
+                    roots.add(now_network.find(x))
+            if roots:
+                targets = [x for x in now_network
+                           if now_network.find(x) in roots]
+                for x in targets:
+                    if x >= 0:
+                        if infected_at[x] == NOT_INFECTED:
+                            infect(x, now)
+                    else:
+                        for i in list(uninfected[-1 - x]):
+                            if infected_at[node[i]] == NOT_INFECTED:
+                                infect(node[i], now)
+        for i in window[k:m]:
+            if end[i] > now:
+                arrive(i, i in joining)
+        k = m
+
+    components = np.empty(num_nodes, dtype=np.int64)
+    components.fill(-1)
+    for n in network:
+        components[n] = network.find(n)
+    return (np.array(infected_at, dtype=np.int64),
+            np.array(contact_times, dtype=dataset.TIME_DTYPE), components)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='See module description.')
+    parser.add_argument('start', type=int,
+                        help='A unix integer that should be considered as ' +\
+                        'time offset 0, and the time the source is infected.')
+    parser.add_argument('source', type=str, help='The source node name')
+    parser.add_argument('-r', '--runway', type=int, default=None,
+                        help='Ignore encounters starting more than this ' +\
+                        'many seconds after start.')
+    parser.add_argument('--lcc', action='store_true',
+                        help='Divide by the size of the largest connected ' +\
+                        'component of the contact network rather than by ' +\
+                        'the number of nodes in contact.')
+    args = parser.parse_args()
+
+    store = dataset.SessionStore.from_lines(sys.stdin)
+    if args.source not in store.mac_ids:
+        parser.error('unknown source %s' % args.source)
+    node, start, end, ap = store.columns()
+    end_time = None if args.runway is None else args.start + args.runway
+    infected_at, times, components = session_infection_times(
+        node, start, end, ap, store.mac_ids[args.source], args.start,
+        end_time, store.num_nodes)
+    infected_at = np.sort(infected_at[infected_at != NOT_INFECTED])
+    counts = np.searchsorted(infected_at, times, side='right')
+    components = components[components >= 0]
+    if args.lcc:
+        population = np.bincount(components).max() if len(components) else 0
+    else:
+        population = len(components)
+    for t, count in zip(times.tolist(), counts.tolist()):
+        print ','.join(map(str, [t - args.start, float(count) / population]))
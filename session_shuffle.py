@@ -11,6 +11,13 @@ data -- an iterable where each element is a 4-element iterable of the
 form <node, start, end, location> that is the product of performing the
 relevant shuffling algorithm over the input data.
 
+Each algorithm also has an array counterpart, named with an ``_arrays``
+suffix, that shuffles the integer columns of a ``dataset.SessionStore``.  It
+takes the <node, start, end, location> columns and a ``numpy.random``
+``RandomState`` and returns the four shuffled columns, with session order
+preserved.  Global shuffles apply a single permutation index and grouped
+shuffles permute within the runs of a stable sort by group key, so no
+per-session Python objects are built.
 
 If called as main script:
 
@@ -29,12 +36,25 @@ positional parameters
 
     A shuffling algorithm acronym.  Call script with -h for available options.
 
+flags
+
+    --replicas : parse the sessions once and write this many replicas, one per
+    seed counting up from --random-seed, to files named by --out-pattern,
+    optionally spread over --workers processes.
+
 """
 
 import sys
 import random
 import argparse
+import functools
 from collections import defaultdict
+import numpy as np
+import dataset
+import replica_pool
+
+# default width, in seconds, of the time buckets of the TLTN shuffle.
+BUCKET_WIDTH = 60 * 60
 
 def tn(sessions):
     """ Shuffle location.
@@ -168,9 +188,12 @@ def lntn(sessions):
     return out
 
 
-def tltn(sessions):
+def tltn(sessions, bucket_width=BUCKET_WIDTH):
     """ Group by time, shuffle node.
 
+    Time is bucketed by session start time into buckets of ``bucket_width``
+    seconds, and nodes are shuffled among the sessions of each bucket.
+
     Correlations retained:
 
         * Time and Location (TL)
@@ -181,9 +204,18 @@ def tltn(sessions):
         * Location and Node (LN)
 
     """
-    # this will need some figuring out because time will need to be "bucketed"
-    # somehow
-    raise NotImplementedError('TLTD not implemented yet!')
+    # key = bucket, value = list of nodes with sessions starting in bucket
+    bucket_macs = defaultdict(list)
+    MAC_IDX, START_IDX = 0, 1
+    for s in sessions:
+        bucket_macs[s[START_IDX] // bucket_width].append(s[MAC_IDX])
+    for k in bucket_macs.keys():
+        random.shuffle(bucket_macs[k])
+    out = []
+    for s in sessions:
+        mac = bucket_macs[s[START_IDX] // bucket_width].pop()
+        out.append([mac, s[1], s[2], s[3]])
+    return out
 
 def destroy_all(sessions):
     """Shuffle by node, shuffle by location.
@@ -214,6 +246,146 @@ def destroy_all(sessions):
     return out
 
 
+def grouped_permutation(keys, rng):
+    """Return an index that permutes elements only among equal keys.
+
+    Parameters
+
+        keys : an n-length array of group keys.
+
+        rng : a ``numpy.random.RandomState``.
+
+    Returns
+
+        An n-length index array ``idx`` such that ``keys[idx] == keys`` and
+        within each group, ``idx`` is a uniformly random permutation of the
+        group's indices.
+
+    """
+    keys = np.asarray(keys)
+    # members of each group in their original order...
+    grouped = np.argsort(keys, kind='mergesort')
+    # ...and in random order.
+    shuffled = np.lexsort((rng.random_sample(len(keys)), keys))
+    idx = np.empty(len(keys), dtype=np.int64)
+    idx[grouped] = shuffled
+    return idx
+
+
+def tn_arrays(node, start, end, ap, rng):
+    """Array counterpart of ``tn``."""
+    return node, start, end, ap[rng.permutation(len(ap))]
+
+
+def ln_arrays(node, start, end, ap, rng):
+    """Array counterpart of ``ln``."""
+    idx = rng.permutation(len(start))
+    return node, start[idx], end[idx], ap
+
+
+def tl_arrays(node, start, end, ap, rng):
+    """Array counterpart of ``tl``."""
+    return node[rng.permutation(len(node))], start, end, ap
+
+
+def tlln_arrays(node, start, end, ap, rng):
+    """Array counterpart of ``tlln``."""
+    idx = grouped_permutation(ap, rng)
+    return node, start[idx], end[idx], ap
+
+
+def lntn_arrays(node, start, end, ap, rng):
+    """Array counterpart of ``lntn``."""
+    return node, start, end, ap[grouped_permutation(node, rng)]
+
+
+def tltn_arrays(node, start, end, ap, rng, bucket_width=BUCKET_WIDTH):
+    """Array counterpart of ``tltn``."""
+    return node[grouped_permutation(start // bucket_width, rng)], start, end, ap
+
+
+def destroy_all_arrays(node, start, end, ap, rng):
+    """Array counterpart of ``destroy_all``."""
+    return (node[rng.permutation(len(node))], start, end,
+            ap[rng.permutation(len(ap))])
+
+
+def array_algorithm(name, bucket_width=BUCKET_WIDTH):
+    """Return the array shuffle for an algorithm name as given to the CLI.
+
+    "original" maps to a function returning its columns unchanged and "_" to
+    ``destroy_all_arrays``.  ``bucket_width`` is bound for "tltn".
+
+    """
+    name = name.lower()
+    if name == 'original':
+        return lambda node, start, end, ap, rng: (node, start, end, ap)
+    if name == '_':
+        name = 'destroy_all'
+    if name == 'tltn':
+        return lambda node, start, end, ap, rng: \
+            tltn_arrays(node, start, end, ap, rng, bucket_width)
+    return getattr(sys.modules[__name__], name + '_arrays')
+
+
+def replicas(store, algorithm, seeds, bucket_width=BUCKET_WIDTH):
+    """Generate shuffled replicas of a session store.
+
+    Parameters
+
+        store : a ``dataset.SessionStore``, parsed once and shared by every
+        replica.
+
+        algorithm : a shuffling algorithm name, as per ``array_algorithm``.
+
+        seeds : an iterable of random seeds, one per replica.
+
+        bucket_width : the TLTN time bucket width in seconds.
+
+    Returns
+
+        A generator of two-tuples <seed, shuffled store>.
+
+    """
+    alg_func = array_algorithm(algorithm, bucket_width)
+    for seed in seeds:
+        rng = np.random.RandomState(seed)
+        yield seed, store.with_columns(*alg_func(*(store.columns() + (rng,))))
+
+
+def _replica(store, algorithm, bucket_width, seed):
+    for _, shuffled in replicas(store, algorithm, [seed], bucket_width):
+        return shuffled
+
+
+def write_replicas(store, algorithm, seeds, pattern, workers=1,
+                   bucket_width=BUCKET_WIDTH):
+    """Write shuffled replicas of a session store to files.
+
+    Parameters
+
+        store, algorithm, seeds, bucket_width : as per ``replicas``.
+
+        pattern : the file name of each replica, formatted with its seed,
+        e.g. "tmp/TL_%d.csv".
+
+        workers : the number of processes to spread replicas over.  Each
+        replica depends only on its seed, so the files do not depend on this
+        value.
+
+    """
+    replica_pool.write_replicas(
+        functools.partial(_replica, store, algorithm, bucket_width),
+        write_sessions, seeds, pattern, workers)
+
+
+def write_sessions(store, out=sys.stdout):
+    """Write a ``dataset.SessionStore`` as comma-separated session lines."""
+    macs, aps = store.macs, store.aps
+    for n, s, e, a in zip(*[c.tolist() for c in store.columns()]):
+        print >> out, ','.join([macs[n], str(s), str(e), aps[a]])
+
+
 if __name__ == "__main__":
     # configure arguments
     parser = argparse.ArgumentParser(
@@ -222,9 +394,42 @@ if __name__ == "__main__":
                         help="One of the null model abbreviations.")
     parser.add_argument('-s', '--random-seed', type=int, default=1000,
                         help='A random seed for shuffling')
+    parser.add_argument('--numpy', action='store_true',
+                        help='Shuffle integer columns with the array ' + \
+                        'implementations.')
+    parser.add_argument('-r', '--replicas', type=int, default=None,
+                        help='Number of replicas to write, with seeds ' + \
+                        'counting up from the random seed.  Implies --numpy.')
+    parser.add_argument('-o', '--out-pattern', type=str,
+                        default='sessions_%d.csv',
+                        help='File name pattern of --replicas output, ' + \
+                        'formatted with the seed.')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='Number of processes to write replicas with.')
+    parser.add_argument('-b', '--bucket-width', type=int,
+                        default=BUCKET_WIDTH,
+                        help='Width in seconds of the TLTN time buckets.')
     args = parser.parse_args()
     random.seed(args.random_seed)
 
+    if args.replicas:
+        store = dataset.SessionStore.from_lines(sys.stdin)
+        seeds = range(args.random_seed, args.random_seed + args.replicas)
+        write_replicas(store, args.algorithm, seeds, args.out_pattern,
+                       args.workers, args.bucket_width)
+        sys.exit(0)
+    if args.numpy:
+        store = dataset.SessionStore.from_lines(sys.stdin)
+        for _, shuffled in replicas(store, args.algorithm,
+                                    [args.random_seed], args.bucket_width):
+            write_sessions(shuffled)
+        sys.exit(0)
+
+    algorithm = args.algorithm.lower()
+    if algorithm == '_':
+        algorithm = 'destroy_all'
+    thismodule = sys.modules[__name__]
+
     # read sessions from stdin
     sessions = []
     for line in sys.stdin:
@@ -232,15 +437,14 @@ if __name__ == "__main__":
         sessions.append([f[0], int(f[1]), int(f[2]), f[3]])
 
     # shuffle (or don't if original)
-    algorithm = args.algorithm.lower()
     if algorithm == 'original':
         for s in sessions:
             print ','.join(map(str, s))
     else:
-        if algorithm == '_':
-            algorithm = 'destroy_all'
-        thismodule = sys.modules[__name__]
         alg_func = getattr(thismodule, algorithm)
-        shuffled = alg_func(sessions)
+        if algorithm == 'tltn':
+            shuffled = alg_func(sessions, args.bucket_width)
+        else:
+            shuffled = alg_func(sessions)
         for s in shuffled:
             print ','.join(map(str, s))
@@ -12,10 +12,24 @@ stdout
     A set of comma-separated value lines describing contact events, each of the
     form <node_1, node_2, start, end, location>.
 
+flags
+
+    store : read sessions from a session store written by ``dataset.py``
+    rather than from stdin.
+
+    tl-replicas : rather than writing encounters to stdout, write the
+    encounters of this many TL-shuffled (node-permuted) replicas of the
+    sessions to files.  The session overlaps are computed once and relabelled
+    for each replica.  Call the script with -h for the related flags.
+
 """
 
 import sys
+import heapq
+import argparse
 from collections import defaultdict
+import numpy as np
+import dataset
 
 def sessions_to_encounters(sessions, start_time=None):
     """Return a set of encounters from a set of sessions.
@@ -71,27 +85,242 @@ def sessions_to_encounters(sessions, start_time=None):
     # if no start_time has been designated, return now. otherwise,
     # discard encounters before start time and ltrim those which
     # straddle it.
-    if not start_time:   
+    if not start_time:
         return encounters
     else:
-        # encounter must end after designated start time
-        encounters = [enc for enc in encounters if enc[3] > start_time]
-        # ltrim encounters if necessary
-        new_encounters = []
-        for enc in encounters:
-            if enc[2] < start_time:
-                new_encounters.append([enc[0],enc[1],start_time,enc[3],enc[4]])
-            else:
-                new_encounters.append(enc)
-        return new_encounters
+        return ltrim_encounters(encounters, start_time)
+
+
+def sweep_sessions_to_encounters(sessions, start_time=None):
+    """Return a set of encounters from a set of sessions using a sweep-line.
+
+    Produces the same encounters as ``sessions_to_encounters`` but keeps each
+    location's active sessions in a min heap keyed by session end time, so
+    sessions that have ended are evicted from the top of the heap rather than
+    by rebuilding the whole candidate list for every session.
+
+    Parameters
+
+        sessions : a list of 4-tuples of the form <node, start, end, location>,
+        describing the times at which individual nodes were present at individual
+        locations.
+
+        start_time : if specified, only returns contacts that have
+        occurred after the designated start time.  Contacts which
+        straddle the designated start time are ltrimmed to commence at the
+        designated start time.
+
+    Returns
+
+        A list of 5-tuples of the form <node_1, node_2, start, end, location>,
+        describing the intervals during which two connected devices encountered.
+        Encounters are ordered by the start of the later session but, within
+        one session, not necessarily in the same order as
+        ``sessions_to_encounters``.
+
+    """
+    # sort by start_time - stable, so sessions starting together keep the
+    # same relative order (and hence node_1/node_2 roles) as the original.
+    sessions.sort(key = lambda x: x[1])
+    # location -> min heap of [end, sequence number, session].  The sequence
+    # number breaks ties on end time without comparing sessions.
+    active = defaultdict(list)
+    encounters = []
+    for seq, sess in enumerate(sessions):
+        ap = sess[3]
+        heap = active[ap]
+        # evict sessions that ended at or before this session starts.
+        while heap and heap[0][0] <= sess[1]:
+            heapq.heappop(heap)
+        for _, _, enc in heap:
+            mac_1 = sess[0]
+            mac_2 = enc[0]
+            if mac_1 != mac_2:
+                encounters.append([mac_1, mac_2, max(sess[1], enc[1]),
+                                   min(sess[2], enc[2]), ap])
+        heapq.heappush(heap, [sess[2], seq, sess])
+    if not start_time:
+        return encounters
+    else:
+        return ltrim_encounters(encounters, start_time)
+
+
+def ltrim_encounters(encounters, start_time):
+    """Discard encounters before a start time and ltrim those straddling it.
+
+    Parameters
+
+        encounters : a list of 5-tuples of the form <node_1, node_2, start,
+        end, location>.
+
+        start_time : encounters must end after this time to be retained.
+        Retained encounters which started before it are ltrimmed to commence
+        at it.
+
+    Returns
+
+        A list of 5-tuples of the same form as ``encounters``.
+
+    """
+    # encounter must end after designated start time
+    encounters = [enc for enc in encounters if enc[3] > start_time]
+    # ltrim encounters if necessary
+    new_encounters = []
+    for enc in encounters:
+        if enc[2] < start_time:
+            new_encounters.append([enc[0],enc[1],start_time,enc[3],enc[4]])
+        else:
+            new_encounters.append(enc)
+    return new_encounters
+
+
+def session_overlaps(start, end, ap):
+    """Return every pair of sessions that overlap at the same location.
+
+    The overlaps depend only on session times and locations, so they can be
+    computed once and shared by any relabelling of session nodes, such as the
+    replicas of a TL shuffle (see ``relabel_overlaps``).
+
+    Parameters
+
+        start, end, ap : equal-length arrays of session start times, end times
+        and location ids.
+
+    Returns
+
+        A 5-tuple of arrays <session_i, session_j, start, end, location>
+        describing one overlap per index, where session_i and session_j index
+        the input sessions and session_i started no earlier than session_j.
+        Pairs of sessions of the same node are included.
+
+    """
+    order = np.argsort(start, kind='mergesort')
+    starts = np.asarray(start)[order].tolist()
+    ends = np.asarray(end)[order].tolist()
+    aps = np.asarray(ap)[order].tolist()
+    # location -> min heap of [end, session index].
+    active = defaultdict(list)
+    sess_i, sess_j, enc_start, enc_end, enc_ap = [], [], [], [], []
+    for i, (s, e, a) in enumerate(zip(starts, ends, aps)):
+        heap = active[a]
+        while heap and heap[0][0] <= s:
+            heapq.heappop(heap)
+        for _, j in heap:
+            sess_i.append(i)
+            sess_j.append(j)
+            enc_start.append(max(s, starts[j]))
+            enc_end.append(min(e, ends[j]))
+            enc_ap.append(a)
+        heapq.heappush(heap, [e, i])
+    return (order[np.array(sess_i, dtype=np.int64)],
+            order[np.array(sess_j, dtype=np.int64)],
+            np.array(enc_start, dtype=dataset.TIME_DTYPE),
+            np.array(enc_end, dtype=dataset.TIME_DTYPE),
+            np.array(enc_ap, dtype=dataset.LOC_DTYPE))
+
+
+def relabel_overlaps(overlaps, node, start_time=None):
+    """Return the encounters implied by session overlaps and session nodes.
+
+    Parameters
+
+        overlaps : a 5-tuple of arrays as returned by ``session_overlaps``.
+
+        node : an array of the node id of each session overlaps was computed
+        from, e.g. after permuting node ids for a TL shuffle.
+
+        start_time : as per ``sessions_to_encounters``.
+
+    Returns
+
+        A 5-tuple of arrays <node_1, node_2, start, end, location> describing
+        one encounter per index.  Overlaps between two sessions of the same
+        node are dropped.
+
+    """
+    sess_i, sess_j, enc_start, enc_end, enc_ap = overlaps
+    node = np.asarray(node, dtype=dataset.NODE_DTYPE)
+    node_1, node_2 = node[sess_i], node[sess_j]
+    keep = node_1 != node_2
+    if start_time:
+        keep &= enc_end > start_time
+        enc_start = np.maximum(enc_start, start_time)
+    return (node_1[keep], node_2[keep], enc_start[keep], enc_end[keep],
+            enc_ap[keep])
+
+
+def sessions_to_encounters_arrays(node, start, end, ap, start_time=None):
+    """Return encounters from integer session columns.
+
+    The array counterpart of ``sweep_sessions_to_encounters`` for sessions held
+    in a ``dataset.SessionStore``.
+
+    Parameters
+
+        node, start, end, ap : equal-length arrays describing sessions of the
+        form <node, start, end, location>, with nodes and locations given as
+        integer ids.
+
+        start_time : as per ``sessions_to_encounters``.
+
+    Returns
+
+        A 5-tuple of arrays <node_1, node_2, start, end, location> describing
+        one encounter per index.
+
+    """
+    return relabel_overlaps(session_overlaps(start, end, ap), node,
+                            start_time)
+
+
+def write_encounters(encounters, macs, aps, out=sys.stdout):
+    """Write encounter arrays as comma-separated lines of names."""
+    node_1, node_2, start, end, ap = encounters
+    for e in zip(node_1.tolist(), node_2.tolist(), start.tolist(),
+                 end.tolist(), ap.tolist()):
+        print >> out, ','.join([macs[e[0]], macs[e[1]], str(e[2]), str(e[3]),
+                                aps[e[4]]])
 
 
 if __name__ == "__main__":
-    sessions = []
-    for line in sys.stdin:
-        # fields
-        f = line.strip().split(',')
-        sessions.append([f[0], int(f[1]), int(f[2]), f[3]])
-    encounters = sessions_to_encounters(sessions)
-    for e in encounters:
-        print ','.join(map(str, e))
+    parser = argparse.ArgumentParser(description='See module description.')
+    parser.add_argument('--store', type=str, default=None,
+                        help='Session store directory to read sessions from.')
+    parser.add_argument('--tl-replicas', type=int, default=None,
+                        help='Write the encounters of this many TL-shuffled ' +\
+                        'replicas, one per seed from --seed, sharing one ' +\
+                        'session overlap computation.')
+    parser.add_argument('-s', '--seed', type=int, default=1000,
+                        help='First random seed of --tl-replicas.')
+    parser.add_argument('-o', '--out-pattern', type=str,
+                        default='tl_encounters_%d.csv',
+                        help='File name pattern of --tl-replicas output, ' +\
+                        'formatted with the seed.')
+    args = parser.parse_args()
+    if args.store:
+        store = dataset.SessionStore.load(args.store)
+    elif args.tl_replicas:
+        store = dataset.SessionStore.from_lines(sys.stdin)
+    if args.tl_replicas:
+        # TL shuffling only permutes the node of each session, so every
+        # replica has the same session overlaps.
+        node, start, end, ap = store.columns()
+        overlaps = session_overlaps(start, end, ap)
+        for seed in range(args.seed, args.seed + args.tl_replicas):
+            rng = np.random.RandomState(seed)
+            shuffled = np.asarray(node)[rng.permutation(len(node))]
+            with open(args.out_pattern % seed, 'w') as f:
+                write_encounters(relabel_overlaps(overlaps, shuffled),
+                                 store.macs, store.aps, f)
+    elif args.store:
+        write_encounters(sessions_to_encounters_arrays(*store.columns()),
+                         store.macs, store.aps)
+    else:
+        sessions = []
+        for line in sys.stdin:
+            # fields
+            f = line.strip().split(',')
+            sessions.append([f[0], int(f[1]), int(f[2]), f[3]])
+        encounters = sweep_sessions_to_encounters(sessions)
+        for e in encounters:
+            print ','.join(map(str, e))
@@ -19,8 +19,8 @@ stdout
 import sys
 import numpy as np
 import math
-from collections import defaultdict
 import argparse
+from running_stats import RunningStats
 
 def sem(x_ys):
     """Calculate the standard error of the mean.
@@ -62,43 +62,23 @@ def avg(x_ys):
 
 
 if __name__ == '__main__':
-    xs, ys = [], []
-    for line in sys.stdin:
-        x, y = map(float, line.strip().split(','))
-        xs.append(x), ys.append(y)
-    x_ys = defaultdict(list) # key = x, value = y-values at x
-    for x, y in zip(xs, ys):
-        x_ys[x].append(y)
-    if len(set([len(v) for v in x_ys.values()])) > 1:
-        print >> sys.stderr, 'WARNING: some x-values have more associated' + \
-        'y-values than others'
-        
     parser = argparse.ArgumentParser()
     parser.add_argument('-s', '--stat', action='append', type=str,
                         help='A stat name from the set ("avg", "sem")')
     args = parser.parse_args()
     assert len(args.stat) > 0, 'Need at least one stat'
-
-    # there is one element per selected summary stat in y_summaries.  Each
-    # element holds the results for that summary.  After all summary stats are
-    # generated, y_summaries are merged on x-values to produce the output lines
-    y_summaries = []
     for stat in args.stat:
-        if stat == "avg":
-            avg_summary = avg(x_ys)
-            y_summaries.append(avg_summary)
-        elif stat == "sem":
-            sem_summary = sem(x_ys)
-            y_summaries.append(sem_summary)
-        else:
+        if stat not in ['avg', 'sem']:
             print >> sys.stderr, 'Unrecognized stat', stat
             sys.exit(1)
-    # merge y-summaries on x-values.
-    output_summaries = defaultdict(list) # key = x, value = y summaries at x
-    for summary in y_summaries:
-        for x,y in summary:
-            output_summaries[x].append(y)
-    # output_summaries now a list
-    output_summaries = sorted([(k,v) for k,v in output_summaries.iteritems()])
-    for x, ys in output_summaries:
-        print ','.join(map(str, [x] + ys))
+
+    # stream through running_stats rather than holding every y-value.
+    running = RunningStats()
+    for line in sys.stdin:
+        x, y = map(float, line.strip().split(','))
+        running.add(x, y)
+    if len(set(running.count.tolist())) > 1:
+        print >> sys.stderr, 'WARNING: some x-values have more associated' + \
+        'y-values than others'
+    for r in running.rows(args.stat):
+        print ','.join(map(str, r))